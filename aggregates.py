@@ -0,0 +1,174 @@
+import pandas as pd
+
+from db import execute_script
+
+# ---------------------------
+# PRE-AGGREGATED DASHBOARD TABLES
+# ---------------------------
+# Summary tables kept current by triggers on 'drugs', so the Dashboard reads a
+# few dozen rows instead of grouping the whole catalog:
+#   agg_by_class / agg_by_type / agg_by_source : number of products per group
+#   price_by_class                             : priced products and price_numeric sum per class
+# Missing group values are counted under 'Unknown'.
+
+# (summary table, grouped column of 'drugs')
+COUNT_TABLES = [
+    ("agg_by_class", "therapeutic_class"),
+    ("agg_by_type", "type"),
+    ("agg_by_source", "source"),
+]
+
+
+def _price_expr(row):
+    """SQL expression reading the normalized price of a 'drugs' row ('new' / 'old' / table alias)."""
+    return f"{row}.price_numeric"
+
+
+def _group(row, col):
+    return f"IFNULL({row}.{col}, 'Unknown')"
+
+
+def _count_statements(row, delta):
+    """Statements adding 'delta' (+1 / -1) to every count table for a 'drugs' row."""
+    statements = []
+    for table, col in COUNT_TABLES:
+        statements.append(
+            f"INSERT INTO {table} (grp, n) VALUES ({_group(row, col)}, {delta}) "
+            f"ON CONFLICT(grp) DO UPDATE SET n = n + ({delta});"
+        )
+        if delta < 0:
+            statements.append(f"DELETE FROM {table} WHERE grp = {_group(row, col)} AND n <= 0;")
+    return statements
+
+
+def _price_statements(row, delta):
+    """Statements adding / removing a 'drugs' row price to its class in 'price_by_class'."""
+    statements = [
+        f"INSERT INTO price_by_class (grp, n_priced, price_sum) "
+        f"SELECT {_group(row, 'therapeutic_class')}, {delta}, {delta} * {_price_expr(row)} "
+        f"WHERE {_price_expr(row)} IS NOT NULL "
+        f"ON CONFLICT(grp) DO UPDATE SET n_priced = n_priced + excluded.n_priced, price_sum = price_sum + excluded.price_sum;"
+    ]
+    if delta < 0:
+        statements.append(f"DELETE FROM price_by_class WHERE grp = {_group(row, 'therapeutic_class')} AND n_priced <= 0;")
+    return statements
+
+
+def _trigger(name, event, statements):
+    body = "\n    ".join(statements)
+    return f"CREATE TRIGGER IF NOT EXISTS {name} {event} ON drugs BEGIN\n    {body}\nEND;"
+
+
+def aggregates_schema():
+    """DDL of the summary tables and of the triggers maintaining them."""
+    tables = [f"CREATE TABLE IF NOT EXISTS {table} (grp TEXT PRIMARY KEY, n INTEGER NOT NULL);" for table, _ in COUNT_TABLES]
+    tables.append(
+        "CREATE TABLE IF NOT EXISTS price_by_class (grp TEXT PRIMARY KEY, n_priced INTEGER NOT NULL, price_sum REAL NOT NULL);"
+    )
+    watched = ", ".join(sorted({col for _, col in COUNT_TABLES} | {"price_numeric"}))
+    triggers = [
+        _trigger("agg_drugs_ai", "AFTER INSERT", _count_statements("new", 1) + _price_statements("new", 1)),
+        _trigger("agg_drugs_ad", "AFTER DELETE", _count_statements("old", -1) + _price_statements("old", -1)),
+        _trigger(
+            "agg_drugs_au", f"AFTER UPDATE OF {watched}",
+            _count_statements("old", -1) + _price_statements("old", -1)
+            + _count_statements("new", 1) + _price_statements("new", 1)
+        ),
+    ]
+    # Indexes serving the molecule lists of each group
+    indexes = [f"CREATE INDEX IF NOT EXISTS idx_drugs_{col}_name ON drugs({col}, name);" for _, col in COUNT_TABLES]
+    return "\n".join(tables + indexes + triggers)
+
+
+def create_aggregates(conn):
+    """Creates the summary tables and triggers; fills the tables when (re)built. Returns True if built."""
+    trigger = conn.execute(
+        "SELECT sql FROM sqlite_master WHERE type = 'trigger' AND name = 'agg_drugs_au'"
+    ).fetchone()
+    if trigger and "price_numeric" in trigger[0]:
+        return False
+    # Missing, or triggers from before the stored 'price_numeric' column: (re)create them
+    for name in ("agg_drugs_ai", "agg_drugs_ad", "agg_drugs_au"):
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+    execute_script(conn, aggregates_schema())
+    rebuild_aggregates(conn)
+    return True
+
+
+def rebuild_aggregates(conn):
+    """Recomputes every summary table from 'drugs' (one GROUP BY per table)."""
+    for table, col in COUNT_TABLES:
+        conn.execute(f"DELETE FROM {table}")
+        conn.execute(f"INSERT INTO {table} (grp, n) SELECT {_group('d', col)}, COUNT(*) FROM drugs AS d GROUP BY 1")
+    conn.execute("DELETE FROM price_by_class")
+    conn.execute(
+        f"INSERT INTO price_by_class (grp, n_priced, price_sum) "
+        f"SELECT {_group('d', 'therapeutic_class')}, COUNT(*), SUM({_price_expr('d')}) "
+        f"FROM drugs AS d WHERE {_price_expr('d')} IS NOT NULL GROUP BY 1"
+    )
+
+
+# ---------------------------
+# READERS
+# ---------------------------
+
+# Names shown in a chart hover: the figure sent to the browser stays small
+# whatever the size of a group; the full list is read on click (group_molecules)
+HOVER_PREVIEW_SIZE = 10
+
+def group_molecules(conn, col, group, limit=None):
+    """Names of the products of one group ('Unknown' = missing value), read through idx_drugs_<col>_name."""
+    if group == "Unknown":
+        sql, params = f"SELECT name FROM drugs WHERE ({col} IS NULL OR {col} = ?) AND name IS NOT NULL ORDER BY name", (group,)
+    else:
+        sql, params = f"SELECT name FROM drugs WHERE {col} = ? AND name IS NOT NULL ORDER BY name", (group,)
+    if limit is not None:
+        sql += f" LIMIT {int(limit)}"
+    return [row[0] for row in conn.execute(sql, params)]
+
+
+def _molecules_preview(names, total):
+    """Hover text: the first names of a group, then how many more there are."""
+    lines = [f"• {x}" for x in names]
+    if total > len(names):
+        lines.append(f"<i>… and {total - len(names)} more (click to list them all)</i>")
+    return "<br>".join(lines)
+
+
+def read_dashboard_data(conn, top_n=10):
+    """
+    Returns (df_class_therapy, df_type, df_source, df_price_class, total_products) from the summary tables.
+
+    Type and source frames are limited to the 'top_n' largest groups (the ones charted).
+    Each frame has a 'molecules_preview' hover text listing at most HOVER_PREVIEW_SIZE names.
+    """
+    def counts(table, label, limit=None):
+        sql = f"SELECT grp AS '{label}', n AS 'Number of Molecules' FROM {table} ORDER BY n DESC, grp"
+        if limit:
+            sql += f" LIMIT {int(limit)}"
+        return pd.read_sql_query(sql, conn)
+
+    df_class_therapy = counts("agg_by_class", "Therapeutic Class").sort_values("Therapeutic Class", ignore_index=True)
+    df_type = counts("agg_by_type", "Form Type (Galenic)", top_n)
+    df_source = counts("agg_by_source", "Source (Manufacturer/Data)", top_n)
+    df_price_class = pd.read_sql_query(
+        "SELECT p.grp AS 'Therapeutic Class', p.price_sum / p.n_priced AS Average_Price, p.n_priced AS Total_Molecules "
+        "FROM price_by_class AS p WHERE p.n_priced > 0",
+        conn,
+    )
+
+    # Molecule previews (chart hovers), one indexed LIMIT lookup per displayed group
+    for frame, label, col, count in [
+        (df_class_therapy, "Therapeutic Class", "therapeutic_class", "Number of Molecules"),
+        (df_type, "Form Type (Galenic)", "type", "Number of Molecules"),
+        (df_source, "Source (Manufacturer/Data)", "source", "Number of Molecules"),
+    ]:
+        frame["molecules_preview"] = [
+            _molecules_preview(group_molecules(conn, col, g, limit=HOVER_PREVIEW_SIZE), n)
+            for g, n in zip(frame[label], frame[count])
+        ]
+    class_previews = dict(zip(df_class_therapy["Therapeutic Class"], df_class_therapy["molecules_preview"]))
+    df_price_class["molecules_preview"] = df_price_class["Therapeutic Class"].map(class_previews).fillna("")
+
+    total_products = int(df_class_therapy["Number of Molecules"].sum())
+    return df_class_therapy, df_type, df_source, df_price_class, total_products
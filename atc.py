@@ -0,0 +1,169 @@
+import pandas as pd
+
+from db import execute_script
+
+# ---------------------------
+# ATC HIERARCHY INDEX
+# ---------------------------
+# WHO ATC codes are a 5-level prefix tree: "C09CA01" is under C (anatomical
+# group) > C09 (therapeutic subgroup) > C09C (pharmacological subgroup) >
+# C09CA (chemical subgroup) > C09CA01 (chemical substance).
+#
+# 'atc_nodes' holds one row per node of the tree met in 'drugs.Code_ATC', with
+# its number of products and the count / sum / sum of squares of their
+# normalized prices (mean and standard deviation without rescanning anything).
+# Triggers on 'drugs' keep it current, like the Dashboard summary tables.
+#
+# A node counts the products whose code starts with it, so the products of a
+# node are the index range "Code_ATC >= node AND Code_ATC < node + U+10FFFF"
+# over idx_drugs_atc, and its children a primary-key range of 'atc_nodes'.
+# A prefix only makes a node when it has the shape of its level (see
+# 'atc_levels'), so malformed codes ("A11EA/A11BA") stop at their last valid level.
+
+ATC_LEVELS = [
+    # (level = code length, GLOB pattern of a code of that level, label)
+    (1, "[A-Z]", "Anatomical group"),
+    (3, "[A-Z][0-9][0-9]", "Therapeutic subgroup"),
+    (4, "[A-Z][0-9][0-9][A-Z]", "Pharmacological subgroup"),
+    (5, "[A-Z][0-9][0-9][A-Z][A-Z]", "Chemical subgroup"),
+    (7, "[A-Z][0-9][0-9][A-Z][A-Z][0-9][0-9]", "Chemical substance"),
+]
+LEVEL_LABELS = {level: label for level, _, label in ATC_LEVELS}
+
+# The 14 anatomical main groups (first level of the classification)
+ANATOMICAL_GROUPS = {
+    "A": "Alimentary tract and metabolism",
+    "B": "Blood and blood forming organs",
+    "C": "Cardiovascular system",
+    "D": "Dermatologicals",
+    "G": "Genito-urinary system and sex hormones",
+    "H": "Systemic hormonal preparations",
+    "J": "Antiinfectives for systemic use",
+    "L": "Antineoplastic and immunomodulating agents",
+    "M": "Musculo-skeletal system",
+    "N": "Nervous system",
+    "P": "Antiparasitic products, insecticides and repellents",
+    "R": "Respiratory system",
+    "S": "Sensory organs",
+    "V": "Various",
+}
+
+_RANGE_END = "\U0010ffff"
+
+
+def _node_statements(row, delta):
+    """Statements adding 'delta' (+1 / -1) to every node above the code of a 'drugs' row."""
+    code, price = f"{row}.Code_ATC", f"{row}.price_numeric"
+    statements = [
+        f"INSERT INTO atc_nodes (code, level, n, n_priced, price_sum, price_sumsq) "
+        f"SELECT substr({code}, 1, l.level), l.level, {delta}, {delta} * ({price} IS NOT NULL), "
+        f"{delta} * IFNULL({price}, 0), {delta} * IFNULL({price} * {price}, 0) "
+        f"FROM atc_levels AS l WHERE substr({code}, 1, l.level) GLOB l.pattern "
+        f"ON CONFLICT(code) DO UPDATE SET n = n + excluded.n, n_priced = n_priced + excluded.n_priced, "
+        f"price_sum = price_sum + excluded.price_sum, price_sumsq = price_sumsq + excluded.price_sumsq;"
+    ]
+    if delta < 0:
+        prefixes = ", ".join(f"substr({code}, 1, {level})" for level, _, _ in ATC_LEVELS)
+        statements.append(f"DELETE FROM atc_nodes WHERE code IN ({prefixes}) AND n <= 0;")
+    return statements
+
+
+def _trigger(name, event, statements):
+    body = "\n    ".join(statements)
+    return f"CREATE TRIGGER IF NOT EXISTS {name} {event} ON drugs BEGIN\n    {body}\nEND;"
+
+
+def atc_schema():
+    """DDL of the ATC tables, the drill-down index and the triggers maintaining 'atc_nodes'."""
+    return "\n".join([
+        "CREATE TABLE IF NOT EXISTS atc_levels (level INTEGER PRIMARY KEY, pattern TEXT NOT NULL, label TEXT NOT NULL);",
+        "CREATE TABLE IF NOT EXISTS atc_nodes ("
+        "code TEXT PRIMARY KEY, level INTEGER NOT NULL, n INTEGER NOT NULL, "
+        "n_priced INTEGER NOT NULL, price_sum REAL NOT NULL, price_sumsq REAL NOT NULL);",
+        "CREATE INDEX IF NOT EXISTS idx_atc_nodes_level ON atc_nodes(level, n);",
+        "CREATE INDEX IF NOT EXISTS idx_drugs_atc ON drugs(Code_ATC, name);",
+        _trigger("atc_drugs_ai", "AFTER INSERT", _node_statements("new", 1)),
+        _trigger("atc_drugs_ad", "AFTER DELETE", _node_statements("old", -1)),
+        _trigger(
+            "atc_drugs_au", "AFTER UPDATE OF Code_ATC, price_numeric",
+            _node_statements("old", -1) + _node_statements("new", 1)
+        ),
+    ])
+
+
+def create_atc_index(conn):
+    """Creates the ATC tables, index and triggers, and fills 'atc_nodes' from 'drugs'."""
+    execute_script(conn, atc_schema())
+    conn.executemany("INSERT OR REPLACE INTO atc_levels (level, pattern, label) VALUES (?, ?, ?)", ATC_LEVELS)
+    rebuild_atc_index(conn)
+
+
+def rebuild_atc_index(conn):
+    """Recomputes every node from 'drugs' (one GROUP BY)."""
+    conn.execute("DELETE FROM atc_nodes")
+    conn.execute(
+        "INSERT INTO atc_nodes (code, level, n, n_priced, price_sum, price_sumsq) "
+        "SELECT substr(d.Code_ATC, 1, l.level), l.level, COUNT(*), COUNT(d.price_numeric), "
+        "IFNULL(SUM(d.price_numeric), 0), IFNULL(SUM(d.price_numeric * d.price_numeric), 0) "
+        "FROM drugs AS d JOIN atc_levels AS l ON substr(d.Code_ATC, 1, l.level) GLOB l.pattern "
+        "GROUP BY 1, 2"
+    )
+
+
+# ---------------------------
+# READERS
+# ---------------------------
+
+def child_level(code):
+    """Level under a node ('' or None: the root, whose children are the anatomical groups); None under a substance."""
+    length = len(code or "")
+    return next((level for level, _, _ in ATC_LEVELS if level > length), None)
+
+
+def node_label(code):
+    """Display name of a node: the anatomical group name at the first level, the code itself below."""
+    if code in ANATOMICAL_GROUPS:
+        return f"{code} — {ANATOMICAL_GROUPS[code]}"
+    return code
+
+
+def read_atc_children(conn, code=None, limit=None):
+    """
+    Children of a node (the anatomical groups without a code), largest first.
+
+    Columns: code, level, products, priced, average_price, price_std (NaN when no product is priced).
+    """
+    level = child_level(code)
+    if level is None:
+        return pd.DataFrame(columns=["code", "level", "products", "priced", "average_price", "price_std"])
+    sql = "SELECT code, level, n AS products, n_priced AS priced, price_sum, price_sumsq FROM atc_nodes WHERE level = ?"
+    params = [level]
+    if code:
+        # Primary-key range: the nodes starting with the parent code
+        sql += " AND code >= ? AND code < ?"
+        params += [code, code + _RANGE_END]
+    sql += " ORDER BY n DESC, code"
+    if limit:
+        sql += f" LIMIT {int(limit)}"
+    df = pd.read_sql_query(sql, conn, params=params)
+    priced = df["priced"].astype("float64").where(df["priced"] > 0)
+    df["average_price"] = df["price_sum"] / priced
+    # Population standard deviation from the running sums (clipped: rounding can make the variance slightly negative)
+    df["price_std"] = (df["price_sumsq"] / priced - df["average_price"] ** 2).clip(lower=0) ** 0.5
+    return df.drop(columns=["price_sum", "price_sumsq"])
+
+
+def read_atc_node(conn, code):
+    """(products, priced, price_sum) of one node, or None if no product is under it."""
+    return conn.execute("SELECT n, n_priced, price_sum FROM atc_nodes WHERE code = ?", (code,)).fetchone()
+
+
+def atc_products(conn, code, limit=None):
+    """Products under a node (code prefix), read from an index range of idx_drugs_atc."""
+    sql = (
+        "SELECT name, scientific_name, Code_ATC, type, dosage, price_numeric, price_currency "
+        "FROM drugs WHERE Code_ATC >= ? AND Code_ATC < ? ORDER BY Code_ATC, name"
+    )
+    if limit is not None:
+        sql += f" LIMIT {int(limit)}"
+    return pd.read_sql_query(sql, conn, params=(code, code + _RANGE_END))
@@ -0,0 +1,322 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# ---------------------------
+# HOT-PATH BENCHMARK SUITE
+# ---------------------------
+# Usage:
+#   python bench/run_bench.py                                   # 10k and 100k products -> bench_results.json
+#   python bench/run_bench.py --scales 10000 100000 1000000 --repeat 5 --output results/v2.json
+#   python bench/run_bench.py --baseline results/v1.json        # also compare with a previous run
+#
+# For each scale, a synthetic database (bench/synthetic.py) is generated once
+# and kept in the temp directory (bench/.. is never written). Every scale is
+# then measured in a fresh interpreter, on a temporary copy of the app:
+#   - the data layer directly (data version, product name index, Products
+#     queries, Dashboard data, chart construction, observations paging,
+#     exports, a burst of concurrent saves), 'repeat' times each;
+#   - the pages, driven headless through streamlit.testing.v1.AppTest (first
+#     paint, next page, search, 1000-row grid, Dashboard, observation insert +
+#     history paging).
+# Results (milliseconds; median, min and all runs) go to a JSON file, so that
+# two versions of the app can be compared with --baseline.
+
+DEFAULT_SCALES = [10000, 100000]
+REGRESSION_RATIO = 1.25  # --baseline flags measures more than 25% slower
+
+DATA_CACHE_DIR = os.path.join(tempfile.gettempdir(), "pharma_bench")
+
+
+def _timed(fn, repeat):
+    """Runs fn() 'repeat' times. Returns (last result, timing summary in ms)."""
+    runs, result = [], None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        runs.append((time.perf_counter() - started) * 1000)
+    return result, {"ms": round(statistics.median(runs), 2), "min_ms": round(min(runs), 2), "runs": [round(r, 2) for r in runs]}
+
+
+# ---------------------------
+# WORKER (one scale, fresh interpreter)
+# ---------------------------
+
+def measure_data_layer(app_dir, db_path, repeat):
+    """Times the data-layer functions behind the pages."""
+    import streamlit  # noqa: F401  registers the "streamlit" Plotly template used by charts.py
+    from aggregates import read_dashboard_data
+    from catalog import read_data_version
+    from charts import build_dashboard_figures
+    from db import ConnectionPool
+    from queries import (
+        INSERT_OBSERVATION, count_observations, count_products, fetch_latest_observations, fetch_observations_page, fetch_products_page,
+    )
+    from export import export_products
+    from search import NameIndex
+    from writer import WriteQueue
+
+    results = {}
+    pool = ConnectionPool(db_path)
+    try:
+        # Sorted product names of the pickers and the bulk upload check, built cold by each process
+        _, results["name_index_build"] = _timed(lambda: NameIndex(pool).names(), repeat)
+
+        with pool.connection() as conn:
+            # Read by every Dashboard rerun to key its caches
+            _, results["data_version"] = _timed(lambda: read_data_version(conn), repeat)
+            term = conn.execute("SELECT substr(name, 1, 4) FROM drugs WHERE name IS NOT NULL LIMIT 1").fetchone()[0]
+
+            _, results["products_count"] = _timed(lambda: count_products(conn), repeat)
+            (_, key), results["products_first_page"] = _timed(lambda: fetch_products_page(conn, 10), repeat)
+
+            def walk_pages(pages=50, search=None):
+                after = None
+                for _ in range(pages):
+                    _, after = fetch_products_page(conn, 10, after=after, search=search)
+                    if after is None:
+                        break
+            _, results["products_50_pages"] = _timed(walk_pages, repeat)
+            _, results["products_search_count"] = _timed(lambda: count_products(conn, term), repeat)
+            _, results["products_search_first_page"] = _timed(lambda: fetch_products_page(conn, 10, search=term), repeat)
+            _, results["products_search_50_pages"] = _timed(lambda: walk_pages(search=term), repeat)
+
+            data, results["dashboard_data"] = _timed(lambda: read_dashboard_data(conn), repeat)
+            figures, results["chart_build"] = _timed(lambda: build_dashboard_figures(data), repeat)
+            results["chart_payload_bytes"] = sum(len(fig.to_json()) for fig in figures.values() if fig is not None)
+
+            _, results["observations_count"] = _timed(lambda: count_observations(conn), repeat)
+
+            # Latest observation of each product of a Products page (products with observations)
+            observed = [row[0] for row in conn.execute("SELECT DISTINCT product_name FROM observations LIMIT 10")]
+            _, results["products_latest_observations"] = _timed(lambda: fetch_latest_observations(conn, observed), repeat)
+
+            def walk_observations(pages=50):
+                after = None
+                for _ in range(pages):
+                    _, after = fetch_observations_page(conn, 10, after=after)
+                    if after is None:
+                        break
+            _, results["observations_50_pages"] = _timed(walk_observations, repeat)
+
+        # Whole-catalog exports, streamed from a cursor
+        for fmt in ("csv", "xlsx"):
+            _, results[f"export_products_{fmt}"] = _timed(lambda: export_products(pool, fmt).close(), repeat)
+
+        # Burst of observation saves from concurrent sessions, group-committed by the write queue
+        writes = WriteQueue(pool)
+
+        def concurrent_saves(sessions=16, saves=25):
+            def session(i):
+                for j in range(saves):
+                    writes.write(INSERT_OBSERVATION, (f"BENCH {i}", "Other", f"Bench save {j}", None))
+            threads = [threading.Thread(target=session, args=(i,)) for i in range(sessions)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        _, results["observation_saves_concurrent"] = _timed(concurrent_saves, repeat)
+        stats = writes.stats()
+        results["observation_saves_average_batch"] = stats["average_batch"]
+        results["observation_saves_latency_p95_ms"] = stats.get("latency_p95_ms")
+        writes.stop()
+    finally:
+        pool.close()
+    return results
+
+
+def measure_pages(app_dir, repeat):
+    """Times the pages through AppTest, as an authenticated user would use them."""
+    from streamlit.testing.v1 import AppTest
+
+    def new_session(page):
+        at = AppTest.from_file(os.path.join(app_dir, "app.py"), default_timeout=600)
+        at.secrets["credentials"] = {"bench": "bench"}
+        at.session_state["authenticated"] = True
+        at.session_state["username"] = "bench"
+        at.session_state["nav_selection"] = page
+        return at
+
+    def run(at):
+        at.run()
+        errors = [e.message for e in at.exception] + [e.value for e in at.error]
+        if errors:
+            raise RuntimeError(f"The app failed while being measured: {errors}")
+        return at
+
+    results = {}
+    # First session: pays for the migrations check, the connection pool and the process-wide caches
+    _, results["products_first_paint_cold"] = _timed(lambda: run(new_session("💊 Products")), 1)
+    at, results["products_first_paint"] = _timed(lambda: run(new_session("💊 Products")), repeat)
+
+    def next_page():
+        next(b for b in at.button if b.label == "Next ➡️").click()
+        return run(at)
+    _, results["products_next_page"] = _timed(next_page, repeat)
+
+    def search():
+        at.text_input(key="product_search_input").input(f"ab{len(search_terms)}")
+        search_terms.append(1)
+        return run(at)
+    search_terms = []
+    _, results["products_search"] = _timed(search, repeat)
+
+    def grid_page(page_size=1000):
+        at = new_session("💊 Products")
+        at.session_state["product_view"] = "📋 Grid"
+        at.session_state["product_page_size_grid"] = page_size
+        return run(at)
+    _, results["products_grid_1000_first_paint"] = _timed(grid_page, repeat)
+
+    _, results["dashboard_first_paint_cold"] = _timed(lambda: run(new_session("📊 Dashboard")), 1)
+    at, results["dashboard_first_paint"] = _timed(lambda: run(new_session("📊 Dashboard")), repeat)
+    _, results["dashboard_rerun"] = _timed(lambda: run(at), repeat)
+
+    at = run(new_session("🧾 Observations"))
+
+    def insert_observation():
+        product = next(s for s in at.selectbox if s.label == "Product")
+        product.set_value(product.options[-1])  # (the first option is the placeholder)
+        at.text_area[0].input(f"Benchmark observation {time.time()}")
+        next(b for b in at.button if "Save" in b.label).click()
+        return run(at)
+    _, results["observation_insert"] = _timed(insert_observation, repeat)
+
+    def history_next_page():
+        at.button(key="obs_next").click()
+        return run(at)
+    _, results["observations_next_page"] = _timed(history_next_page, repeat)
+    return results
+
+
+def worker(app_dir, repeat):
+    """Entry point of the per-scale interpreter: prints the results as JSON on the last line."""
+    os.chdir(app_dir)
+    sys.path.insert(0, app_dir)
+    db_path = os.path.join(app_dir, "data", "all_pharma.db")
+    results = measure_data_layer(app_dir, db_path, repeat)
+    results.update(measure_pages(app_dir, repeat))
+    print(json.dumps(results))
+
+
+# ---------------------------
+# DRIVER
+# ---------------------------
+
+def synthetic_database(scale, seed):
+    """Path of the synthetic database of a scale, generated on first use. Returns (path, generation timings)."""
+    from synthetic import generate_database
+
+    os.makedirs(DATA_CACHE_DIR, exist_ok=True)
+    path = os.path.join(DATA_CACHE_DIR, f"drugs_{scale}_seed{seed}.db")
+    if os.path.exists(path):
+        return path, None
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    timings = generate_database(tmp_path, scale, seed=seed)
+    os.replace(tmp_path, path)
+    return path, {step: round(seconds * 1000, 1) for step, seconds in timings.items()}
+
+
+def run_scale(scale, repeat, seed):
+    db_path, generation = synthetic_database(scale, seed)
+    with tempfile.TemporaryDirectory(prefix=f"pharma_bench_{scale}_") as tmp:
+        app_dir = os.path.join(tmp, "app")
+        shutil.copytree(ROOT, app_dir, ignore=shutil.ignore_patterns(".git", "__pycache__", "bench", "*.db", "*.db-wal", "*.db-shm"))
+        shutil.copyfile(db_path, os.path.join(app_dir, "data", "all_pharma.db"))
+        result = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--worker", app_dir, "--repeat", str(repeat)],
+            capture_output=True, text=True,
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"Benchmark of scale {scale} failed:\n{result.stderr[-3000:]}")
+        measures = json.loads(result.stdout.strip().splitlines()[-1])
+    if generation:
+        measures["generation_ms"] = generation
+    return measures
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline):
+    """Prints the measures more than REGRESSION_RATIO slower than in the baseline. Returns their number."""
+    regressions = 0
+    for scale, measures in results["scales"].items():
+        previous = baseline.get("scales", {}).get(scale, {})
+        for name, measure in measures.items():
+            if not isinstance(measure, dict) or name not in previous or "ms" not in measure:
+                continue
+            before, now = previous[name]["ms"], measure["ms"]
+            if before and now / before > REGRESSION_RATIO:
+                regressions += 1
+                print(f"  ❌ {scale:>8} {name:<30} {before:>10.1f} -> {now:>10.1f} ms (x{now / before:.2f})")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the app's hot paths on synthetic catalogs.")
+    parser.add_argument("--scales", type=int, nargs="+", default=DEFAULT_SCALES, help="Numbers of products (default: %(default)s)")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measure (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="bench_results.json", help="JSON results file (default: %(default)s)")
+    parser.add_argument("--baseline", default=None, help="Previous results file to compare with")
+    parser.add_argument("--worker", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args.worker, args.repeat)
+        return
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    sys.path.insert(0, ROOT)
+    results = {
+        "meta": {
+            "revision": git_revision(),
+            "date": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+            "seed": args.seed,
+        },
+        "scales": {},
+    }
+    for scale in args.scales:
+        print(f"⏱️ {scale} products...", flush=True)
+        measures = run_scale(scale, args.repeat, args.seed)
+        results["scales"][str(scale)] = measures
+        for name, measure in measures.items():
+            if isinstance(measure, dict) and "ms" in measure:
+                print(f"  {name:<32}{measure['ms']:>12.1f} ms")
+            elif not isinstance(measure, dict):
+                print(f"  {name:<32}{measure:>12}")
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"✅ Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"Comparison with {args.baseline} (revision {baseline.get('meta', {}).get('revision')}):")
+        if compare(results, baseline):
+            sys.exit(1)
+        print("  ✅ No regression")
+
+
+if __name__ == "__main__":
+    main()
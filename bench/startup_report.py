@@ -0,0 +1,235 @@
+import argparse
+import ast
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+# ---------------------------
+# STARTUP REPORT
+# ---------------------------
+# Usage:
+#   python bench/startup_report.py                      # report + check against the default budget
+#   python bench/startup_report.py --json startup.json  # also save the measures
+#   python bench/startup_report.py --budget login_paint=1500 --budget dashboard_imports=150
+#
+# Two kinds of measures, each in a fresh interpreter so that nothing is warm:
+#   *_imports : import time of each stage of the app (python -X importtime), in the
+#               order app.py imports them: the login screen, then the data
+#               modules once authenticated, then Plotly on the Dashboard. The
+#               modules of each stage are read from app.py itself, see
+#               app_import_stages().
+#   *_paint   : wall time of a headless run of app.py (streamlit AppTest) from
+#               a cold process: login screen, login -> Home, then Home -> Dashboard.
+# The app runs on a temporary copy of the repository, so the database in data/
+# is never migrated or written by the report. Exits with status 1 when a
+# measure is over its budget.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(ROOT, "app.py")
+
+# Budget of each measure, in milliseconds
+DEFAULT_BUDGET_MS = {
+    "login_imports": 600,
+    "app_imports": 600,
+    "dashboard_imports": 150,
+    "login_paint": 1000,
+    "login_to_home_paint": 1500,
+    "dashboard_paint": 1500,
+}
+
+_IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)$")
+_STAGE_MARKER = "--- startup_report stage: "
+
+
+def _module_names(node):
+    if isinstance(node, ast.Import):
+        return [alias.name for alias in node.names]
+    if isinstance(node, ast.ImportFrom) and not node.level:
+        return [node.module]
+    return []
+
+
+def _calls_stop(node):
+    """True when a statement calls st.stop() (outside the functions it defines)."""
+    if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+        return False
+    return any(
+        isinstance(inner, ast.Call) and isinstance(inner.func, ast.Attribute) and inner.func.attr == "stop"
+        for inner in ast.walk(node)
+    )
+
+
+def app_import_stages(app_path=APP):
+    """
+    (stage, modules) in the order app.py imports them, read from its source:
+    the module-level imports up to the authentication block (the first
+    statement calling st.stop()) make the login screen, those after it the
+    authenticated sessions, and the imports inside functions (Plotly) the
+    Dashboard. A module imported by an earlier stage is not counted again.
+    """
+    with open(app_path, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    stages = {"login_imports": [], "app_imports": [], "dashboard_imports": []}
+    seen = set()
+
+    def add(stage, node):
+        for module in _module_names(node):
+            if module not in seen:
+                seen.add(module)
+                stages[stage].append(module)
+
+    def visit(node, stage):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            stage = "dashboard_imports"
+        add(stage, node)
+        for child in ast.iter_child_nodes(node):
+            visit(child, stage)
+
+    stage = "login_imports"
+    deferred = []
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            deferred.append(node)  # imported on first call, after every module-level import
+            continue
+        visit(node, stage)
+        if stage == "login_imports" and _calls_stop(node):
+            stage = "app_imports"
+    for node in deferred:
+        visit(node, "dashboard_imports")
+    return list(stages.items())
+
+
+def measure_imports(stages=None, top=5):
+    """Cumulative import time (ms) of each stage (app_import_stages() by default), and its heaviest top-level imports."""
+    if stages is None:
+        stages = app_import_stages()
+    code = ["import sys"]
+    for stage, modules in stages:
+        code.append(f"sys.stderr.write({_STAGE_MARKER + stage!r} + '\\n')")
+        code.extend(f"import {module}" for module in modules)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "\n".join(code)],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+
+    report = {}
+    stage = None
+    for line in result.stderr.splitlines():
+        if line.startswith(_STAGE_MARKER):
+            stage = line[len(_STAGE_MARKER):]
+            report[stage] = {"ms": 0.0, "heaviest": []}
+            continue
+        match = _IMPORTTIME_RE.match(line)
+        # Top-level entries only (no indentation): their cumulative time includes their own imports
+        if stage and match and not match.group(3):
+            ms = int(match.group(2)) / 1000
+            report[stage]["ms"] += ms
+            report[stage]["heaviest"].append((match.group(4), round(ms, 1)))
+    for entry in report.values():
+        entry["ms"] = round(entry["ms"], 1)
+        entry["heaviest"] = sorted(entry["heaviest"], key=lambda item: -item[1])[:top]
+    return report
+
+
+def measure_paint(app_dir):
+    """Headless runs of app.py in this (cold) process. Returns the wall time of each step in ms."""
+    from streamlit.testing.v1 import AppTest
+
+    os.chdir(app_dir)
+    sys.path.insert(0, app_dir)
+    timings = {}
+
+    at = AppTest.from_file(os.path.join(app_dir, "app.py"), default_timeout=120)
+    at.secrets["credentials"] = {"bench": "bench"}
+
+    started = time.perf_counter()
+    at.run()
+    timings["login_paint"] = (time.perf_counter() - started) * 1000
+
+    at.text_input(key="login_user").input("bench")
+    at.text_input(key="login_pwd").input("bench")
+    started = time.perf_counter()
+    at.button[0].click().run()
+    timings["login_to_home_paint"] = (time.perf_counter() - started) * 1000
+
+    at.radio(key="nav_selection_radio").set_value("📊 Dashboard")
+    started = time.perf_counter()
+    at.run()
+    timings["dashboard_paint"] = (time.perf_counter() - started) * 1000
+
+    errors = [e.message for e in at.exception] + [e.value for e in at.error]
+    if errors:
+        raise RuntimeError(f"The app failed while being measured: {errors}")
+    return {name: round(ms, 1) for name, ms in timings.items()}
+
+
+def run_paint_measure():
+    """Runs measure_paint() in a fresh interpreter, on a temporary copy of the repository."""
+    with tempfile.TemporaryDirectory(prefix="startup_report_") as tmp:
+        app_dir = os.path.join(tmp, "app")
+        shutil.copytree(ROOT, app_dir, ignore=shutil.ignore_patterns(".git", "__pycache__", "*.db-wal", "*.db-shm"))
+        result = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--paint-only", app_dir],
+            capture_output=True, text=True,
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"Paint measure failed:\n{result.stderr[-2000:]}")
+        return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def parse_budget(overrides):
+    budget = dict(DEFAULT_BUDGET_MS)
+    for item in overrides:
+        name, _, value = item.partition("=")
+        if name not in budget:
+            raise SystemExit(f"Unknown budget '{name}', expected one of: {', '.join(budget)}")
+        budget[name] = float(value)
+    return budget
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure import times and first-paint times of the app against a budget.")
+    parser.add_argument("--budget", action="append", default=[], metavar="NAME=MS", help="Override one budget (repeatable)")
+    parser.add_argument("--json", default=None, help="Also write the report to this JSON file")
+    parser.add_argument("--paint-only", default=None, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.paint_only:
+        # Child process of run_paint_measure(): print the timings as the last line
+        print(json.dumps(measure_paint(args.paint_only)))
+        return
+
+    budget = parse_budget(args.budget)
+    imports = measure_imports()
+    measures = {stage: entry["ms"] for stage, entry in imports.items()}
+    measures.update(run_paint_measure())
+
+    over = []
+    print(f"{'measure':<22}{'ms':>10}{'budget':>10}")
+    for name, ms in measures.items():
+        flag = ""
+        if ms > budget[name]:
+            over.append(name)
+            flag = "  ❌ over budget"
+        print(f"{name:<22}{ms:>10.1f}{budget[name]:>10.0f}{flag}")
+        if name in imports:
+            heaviest = ", ".join(f"{module} {module_ms:.0f}" for module, module_ms in imports[name]["heaviest"])
+            print(f"{'':<4}heaviest: {heaviest}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"measures": measures, "budget": budget, "imports": imports, "over_budget": over}, f, indent=2)
+
+    if over:
+        print(f"❌ Over budget: {', '.join(over)}")
+        sys.exit(1)
+    print("✅ Startup within budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+import argparse
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from migrations import DRUGS_SCHEMA, migrate_connection  # noqa: E402
+from queries import OBSERVATION_TYPES  # noqa: E402
+
+# ---------------------------
+# SYNTHETIC CATALOG GENERATOR
+# ---------------------------
+# Usage:
+#   python bench/synthetic.py 100000 /tmp/drugs_100k.db            # 100k products, 10k observations
+#   python bench/synthetic.py 1000000 /tmp/drugs_1m.db --observations 1000000
+#
+# Builds a database with the real 'drugs' schema, then brings it up to date with
+# the app's migrations (search index, change log, normalized prices, summary
+# tables...), exactly like a production database.
+#
+# Column values follow the real catalog (data/all_pharma.db): therapeutic
+# classes, galenic forms, sources and ATC codes are drawn with their observed
+# frequencies and missing-value rates. The number of classes and forms stays
+# the real one at any scale; sources and ATC codes grow with the square root of
+# the catalog size, as new manufacturers and molecules do.
+
+REFERENCE_DB = os.path.join(ROOT, "data", "all_pharma.db")
+
+DRUG_COLUMNS = ["scientific_name", "Code_ATC", "therapeutic_class", "description", "type", "source", "name", "dosage", "price"]
+
+_SYLLABLES = ["ab", "ac", "al", "am", "an", "ar", "ba", "be", "ci", "co", "da", "de", "do", "fa", "fe", "ga", "gli",
+              "la", "le", "li", "lo", "ma", "me", "mi", "mo", "na", "ne", "ni", "no", "pa", "pi", "pra", "ra", "re",
+              "ri", "ro", "sa", "se", "si", "so", "ta", "te", "ti", "to", "tra", "va", "ve", "vi", "xa", "zo"]
+_SUFFIXES = ["ine", "ol", "ide", "ate", "one", "ex", "il", "an", "ax", "um"]
+_DOSAGES = ["5mg", "10mg", "20mg", "25mg", "40mg", "50mg", "100mg", "250mg", "500mg", "1g", "10mg/ml", "100UI/ml"]
+
+
+def reference_distribution(conn, column):
+    """(values, probabilities) of a column of the reference catalog, None standing for a missing value."""
+    rows = conn.execute(f"SELECT {column}, COUNT(*) FROM drugs GROUP BY 1").fetchall()
+    values = [row[0] for row in rows]
+    counts = np.array([row[1] for row in rows], dtype=float)
+    return values, counts / counts.sum()
+
+
+def _grow(values, probabilities, target, make_value):
+    """Adds synthetic values (Zipf-like frequencies) until the distribution has 'target' distinct non-missing values."""
+    missing = [i for i, v in enumerate(values) if v is None]
+    known = len(values) - len(missing)
+    if target <= known:
+        return values, probabilities
+    extra = target - known
+    extra_weights = 1.0 / np.arange(2, extra + 2)
+    # The synthetic values share the non-missing probability mass with the real ones
+    present = 1.0 - probabilities[missing].sum()
+    extra_probabilities = extra_weights / extra_weights.sum() * present * 0.5
+    scaled = probabilities.copy()
+    scaled[[i for i in range(len(values)) if i not in missing]] *= 0.5
+    return values + [make_value(i) for i in range(extra)], np.concatenate([scaled, extra_probabilities])
+
+
+def _names(n, rng):
+    """Distinct-looking product names made of 2-3 syllables and a suffix."""
+    syllables = np.array(_SYLLABLES)
+    parts = [syllables[rng.integers(0, len(syllables), n)] for _ in range(3)]
+    third = rng.random(n) < 0.5
+    suffixes = np.array(_SUFFIXES)[rng.integers(0, len(_SUFFIXES), n)]
+    return [
+        (a + b + (c if t else "") + s).upper()
+        for a, b, c, t, s in zip(parts[0], parts[1], parts[2], third, suffixes)
+    ]
+
+
+def _prices(n, rng):
+    """Raw prices in the shapes met in the sources: REAL, '1234,56 DA' text, or missing."""
+    amounts = np.round(rng.lognormal(mean=6.5, sigma=1.2, size=n), 2)
+    kind = rng.random(n)
+    prices = []
+    for amount, k in zip(amounts, kind):
+        if k < 0.2:
+            prices.append(None)
+        elif k < 0.45:
+            prices.append(float(amount))
+        elif k < 0.9:
+            prices.append(f"Prix (PPA) : \n{amount:.2f} DA".replace(".", ","))
+        else:
+            prices.append(f"{amount:.2f} €/boîte")
+    return prices
+
+
+def generate_drugs(n, seed=0, reference_db=REFERENCE_DB):
+    """Yields 'drugs' rows (tuples in DRUG_COLUMNS order) in batches of 10,000."""
+    rng = np.random.default_rng(seed)
+    ref = sqlite3.connect(reference_db)
+    try:
+        distributions = {col: reference_distribution(ref, col) for col in ["therapeutic_class", "type", "source", "Code_ATC"]}
+        name_missing = ref.execute("SELECT AVG(name IS NULL) FROM drugs").fetchone()[0] or 0.0
+    finally:
+        ref.close()
+
+    growth = int(np.sqrt(n))
+    distributions["source"] = _grow(*distributions["source"], growth, lambda i: f"Laboratoire {i + 1}")
+    distributions["Code_ATC"] = _grow(
+        *distributions["Code_ATC"], growth,
+        lambda i: f"{'ABCDGHJLMNPRSV'[i % 14]}{i % 100:02d}{chr(65 + i // 100 % 26)}{chr(65 + i // 2600 % 26)}{i % 97:02d}"
+    )
+
+    for start in range(0, n, 10000):
+        size = min(10000, n - start)
+        drawn = {
+            col: [values[i] for i in rng.choice(len(values), size=size, p=probabilities)]
+            for col, (values, probabilities) in distributions.items()
+        }
+        names = _names(size, rng)
+        dosages = np.array(_DOSAGES)[rng.integers(0, len(_DOSAGES), size)]
+        name_is_missing = rng.random(size) < name_missing
+        prices = _prices(size, rng)
+        yield [
+            (
+                f"{name.capitalize()} {dosage}",
+                drawn["Code_ATC"][i],
+                drawn["therapeutic_class"][i],
+                None,
+                drawn["type"][i],
+                drawn["source"][i],
+                None if name_is_missing[i] else f"{name} {dosage}",
+                dosage,
+                prices[i],
+            )
+            for i, (name, dosage) in enumerate(zip(names, dosages))
+        ]
+
+
+def generate_observations(conn, n, seed=0, days=3 * 365):
+    """Inserts 'n' observations on random products, dated over the last 'days' days."""
+    rng = np.random.default_rng(seed + 1)
+    names = [row[0] for row in conn.execute("SELECT DISTINCT name FROM drugs WHERE name IS NOT NULL")]
+    if not names or n <= 0:
+        return
+    now = datetime.now().replace(microsecond=0)
+    for start in range(0, n, 10000):
+        size = min(10000, n - start)
+        offsets = rng.integers(0, days * 86400, size)
+        rows = [
+            (
+                names[i],
+                OBSERVATION_TYPES[t],
+                f"Synthetic observation #{start + j + 1}",
+                (now - timedelta(seconds=int(offset))).strftime("%Y-%m-%d %H:%M:%S"),
+            )
+            for j, (i, t, offset) in enumerate(zip(
+                rng.integers(0, len(names), size), rng.integers(0, len(OBSERVATION_TYPES), size), offsets
+            ))
+        ]
+        with conn:
+            conn.executemany("INSERT INTO observations (product_name, type, comment, date) VALUES (?, ?, ?, ?)", rows)
+
+
+def generate_database(path, n_drugs, n_observations=None, seed=0):
+    """
+    Creates a synthetic database at 'path' (replaced if it exists). Returns the timings in seconds.
+
+    Products are inserted before the migrations run, so the indexes, search
+    index and summary tables are built in bulk instead of row by row.
+    """
+    if n_observations is None:
+        n_observations = n_drugs // 10
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+    timings = {}
+    started = time.perf_counter()
+    conn = sqlite3.connect(path)
+    try:
+        conn.executescript(DRUGS_SCHEMA)
+        for batch in generate_drugs(n_drugs, seed=seed):
+            with conn:
+                conn.executemany(
+                    f"INSERT INTO drugs ({', '.join(DRUG_COLUMNS)}) VALUES ({', '.join('?' for _ in DRUG_COLUMNS)})", batch
+                )
+        timings["insert_drugs"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        migrate_connection(conn)
+        timings["migrate"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        generate_observations(conn, n_observations, seed=seed)
+        timings["insert_observations"] = time.perf_counter() - started
+    finally:
+        conn.close()
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate a synthetic pharma database with the app's schema.")
+    parser.add_argument("drugs", type=int, help="Number of products")
+    parser.add_argument("path", help="Database file to create (replaced if it exists)")
+    parser.add_argument("--observations", type=int, default=None, help="Number of observations (default: products / 10)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    timings = generate_database(args.path, args.drugs, args.observations, seed=args.seed)
+    print("✅ " + ", ".join(f"{step} {seconds:.1f}s" for step, seconds in timings.items()))
+
+
+if __name__ == "__main__":
+    main()
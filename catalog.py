@@ -0,0 +1,76 @@
+import pandas as pd
+
+from db import execute_script
+
+# ---------------------------
+# CHANGE LOG OF THE 'drugs' TABLE
+# ---------------------------
+# Triggers record, for every inserted / updated / deleted row of 'drugs', the
+# rowid and a sequence number that grows with each change. The log keeps one
+# row per drug (the latest change), so it never grows beyond the table itself.
+#
+# (MAX(seq), PRAGMA schema_version) is the "data version" of the catalog: it is
+# cheap to read (one index lookup) and changes whenever a row or the table
+# structure changes, whatever process or connection made the change.
+
+CHANGE_LOG_SCHEMA = """
+CREATE TABLE IF NOT EXISTS drug_changes (
+    drug_rowid INTEGER PRIMARY KEY,
+    seq INTEGER NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_drug_changes_seq ON drug_changes(seq);
+
+CREATE TRIGGER IF NOT EXISTS drug_changes_ai AFTER INSERT ON drugs BEGIN
+    INSERT OR REPLACE INTO drug_changes (drug_rowid, seq)
+    VALUES (new.rowid, (SELECT IFNULL(MAX(seq), 0) + 1 FROM drug_changes));
+END;
+
+CREATE TRIGGER IF NOT EXISTS drug_changes_au AFTER UPDATE ON drugs BEGIN
+    INSERT OR REPLACE INTO drug_changes (drug_rowid, seq)
+    VALUES (old.rowid, (SELECT IFNULL(MAX(seq), 0) + 1 FROM drug_changes));
+    INSERT OR REPLACE INTO drug_changes (drug_rowid, seq)
+    VALUES (new.rowid, (SELECT IFNULL(MAX(seq), 0) + 1 FROM drug_changes));
+END;
+
+CREATE TRIGGER IF NOT EXISTS drug_changes_ad AFTER DELETE ON drugs BEGIN
+    INSERT OR REPLACE INTO drug_changes (drug_rowid, seq)
+    VALUES (old.rowid, (SELECT IFNULL(MAX(seq), 0) + 1 FROM drug_changes));
+END;
+"""
+
+
+def create_change_log(conn):
+    """Creates the 'drug_changes' table and the triggers filling it."""
+    execute_script(conn, CHANGE_LOG_SCHEMA)
+
+
+def read_data_version(conn):
+    """Returns the current (schema_version, change seq) marker of the 'drugs' table."""
+    schema_version = conn.execute("PRAGMA schema_version").fetchone()[0]
+    seq = conn.execute("SELECT IFNULL(MAX(seq), 0) FROM drug_changes").fetchone()[0]
+    return (schema_version, seq)
+
+
+# ---------------------------
+# CLEANING
+# ---------------------------
+
+# Classification columns charted / grouped on: a missing value is its own 'Unknown' group
+UNKNOWN_COLUMNS = ['therapeutic_class', 'type', 'source', 'Code_ATC']
+
+
+def clean_drugs_frame(df):
+    """Normalizes rows read from 'drugs': 'Unknown' for missing classifications, numeric 'price_numeric'."""
+    # 'price_numeric' is stored at write time (see prices.py): nothing to parse here
+    if 'price_numeric' not in df.columns:
+        df['price_numeric'] = pd.NA
+    df['price_numeric'] = pd.to_numeric(df['price_numeric'], errors='coerce').astype('float64')
+
+    for col in UNKNOWN_COLUMNS:
+        if col in df.columns:
+            values = df[col].astype(object)
+            # fillna() before any string conversion, so that missing values really become 'Unknown'
+            df[col] = values.where(values.notna(), 'Unknown').astype(str)
+
+    return df
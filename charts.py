@@ -0,0 +1,228 @@
+import threading
+
+import plotly.express as px
+
+# ---------------------------
+# DASHBOARD CHART BUILDERS
+# ---------------------------
+# Imported by the Dashboard page only, so that the login screen and the other
+# pages never pay for importing Plotly.
+#
+# Hovers show the group size and a capped 'molecules_preview' (see
+# aggregates.HOVER_PREVIEW_SIZE): the full molecule lists are never embedded in
+# the figures, they are listed on click by the Dashboard page.
+
+PLOTLY_TEMPLATE = "streamlit"
+
+# Theme types reported by st.context.theme, and the page background of each (pie slice borders)
+THEMES = ("light", "dark")
+BACKGROUND_COLORS = {"light": "#FFFFFF", "dark": "#0E1117"}
+
+
+def create_pie_chart(df, names_col, values_col, title, theme="light"):
+    if df.empty:
+        return None
+    fig = px.pie(
+        df,
+        names=names_col,
+        values=values_col,
+        title=title,
+        hole=0.3,
+        color_discrete_sequence=px.colors.qualitative.Pastel,
+        template=PLOTLY_TEMPLATE,
+        hover_data={'molecules_preview': True}
+    )
+    fig.update_traces(
+        hovertemplate="<b>%{label}</b><br>%{value} molecules<br><br><b>Molecules:</b><br>%{customdata[0]}",
+        textinfo='percent+label',
+        marker=dict(line=dict(color=BACKGROUND_COLORS.get(theme, '#FFFFFF'), width=1))
+    )
+    fig.update_layout(
+        showlegend=True,
+        margin=dict(l=20, r=20, t=50, b=20),
+        height=400,
+    )
+    return fig
+
+
+def create_bar_chart(df, x_col, y_col, color_col, title, y_title="Number of Molecules"):
+    if df.empty:
+        return None
+    fig = px.bar(
+        df,
+        x=x_col,
+        y=y_col,
+        color=color_col,
+        title=title,
+        text_auto=True,
+        color_discrete_sequence=px.colors.qualitative.Vivid,
+        template=PLOTLY_TEMPLATE,
+        hover_data={'molecules_preview': True}
+    )
+    fig.update_traces(
+        hovertemplate="<b>%{x}</b><br>%{y} molecules<br><br><b>Molecules:</b><br>%{customdata[0]}"
+    )
+    fig.update_layout(
+        xaxis_title=x_col,
+        yaxis_title=y_title,
+        showlegend=False,
+        margin=dict(l=20, r=20, t=50, b=20),
+        height=400,
+    )
+    fig.update_xaxes(tickangle=45, tickfont=dict(size=10))
+    return fig
+
+
+def create_price_bar_chart(df, x_col, y_col, title):
+    if df.empty:
+        return None
+    fig = px.bar(
+        df,
+        x=x_col,
+        y=y_col,
+        title=title,
+        text_auto='.2s',
+        template=PLOTLY_TEMPLATE,
+        hover_data={'molecules_preview': True, 'Total_Molecules': True}
+    )
+    # One trace with a color per bar (not color=x_col, which makes one trace per class):
+    # the figure JSON grows by one color string per class instead of a whole trace
+    palette = px.colors.qualitative.Safe
+    fig.update_traces(
+        marker_color=[palette[i % len(palette)] for i in range(len(df))],
+        hovertemplate="<b>%{x}</b><br>Average price: %{y:.2f} (%{customdata[1]} priced molecules)<br><br><b>Molecules:</b><br>%{customdata[0]}"
+    )
+    fig.update_layout(
+        xaxis_title=x_col,
+        yaxis_title="Average Price",
+        showlegend=False,
+        margin=dict(l=20, r=20, t=50, b=20),
+        height=400,
+    )
+    fig.update_xaxes(tickangle=45, tickfont=dict(size=10))
+    return fig
+
+
+def create_atc_chart(df, title):
+    """Bar chart of ATC nodes (read_atc_children() output): products per node, prices in the hover."""
+    if df.empty:
+        return None
+    df = df.assign(
+        label=df["label"] if "label" in df.columns else df["code"],
+        price_text=[
+            f"{avg:.2f} ± {std:.2f} ({priced} priced)" if priced else "no priced product"
+            for avg, std, priced in zip(df["average_price"], df["price_std"].fillna(0), df["priced"])
+        ],
+    )
+    fig = px.bar(
+        df,
+        x="code",
+        y="products",
+        title=title,
+        text_auto=True,
+        color_discrete_sequence=px.colors.qualitative.Prism,
+        template=PLOTLY_TEMPLATE,
+        hover_data={"label": True, "price_text": True},
+    )
+    fig.update_traces(
+        hovertemplate="<b>%{customdata[0]}</b><br>%{y} products<br>Average price: %{customdata[1]}<extra></extra>"
+    )
+    fig.update_layout(
+        xaxis_title="ATC code",
+        yaxis_title="Number of Products",
+        showlegend=False,
+        margin=dict(l=20, r=20, t=50, b=20),
+        height=400,
+    )
+    fig.update_xaxes(type="category", tickangle=45, tickfont=dict(size=10))
+    return fig
+
+
+def build_dashboard_figures(data, theme="light"):
+    """Builds the four Dashboard figures from read_dashboard_data() output (None for an empty chart)."""
+    df_class_therapy, df_type, df_source, df_price_class, _ = data
+    return {
+        "class": create_pie_chart(df_class_therapy, 'Therapeutic Class', 'Number of Molecules', "Distribution by Therapeutic Class", theme=theme),
+        "type": create_bar_chart(df_type.head(10), 'Form Type (Galenic)', 'Number of Molecules', 'Form Type (Galenic)', "Top 10 Distributions by Form Type"),
+        "source": create_bar_chart(df_source.head(10), 'Source (Manufacturer/Data)', 'Number of Molecules', 'Source (Manufacturer/Data)', "Top 10 Distributions by Source"),
+        "price": create_price_bar_chart(
+            df_price_class.sort_values(by='Average_Price', ascending=False) if not df_price_class.empty else df_price_class,
+            'Therapeutic Class', 'Average_Price', "Average Price by Therapeutic Class"
+        ),
+    }
+
+
+# ---------------------------
+# SHARED FIGURE CACHE
+# ---------------------------
+
+class FigureCache:
+    """
+    Dashboard data and figures built once per (data version, theme) and shared by every session.
+
+    Building the figures with Plotly Express is the slow part of a Dashboard
+    rerun; a cached Figure only has to be serialized by st.plotly_chart (which
+    copies it, so a shared figure is never modified). Only the figures of the
+    last 'max_versions' data versions are kept. warm() prebuilds them (the
+    background refresher calls it after every change), so that the next Dashboard
+    visit finds them ready.
+
+    'load_data' returns (data version, read_dashboard_data() output) read from
+    one snapshot: data written after 'data_version' was read are cached under
+    their own, newer version, never under the one asked for.
+    """
+
+    def __init__(self, load_data, max_versions=2):
+        self.load_data = load_data  # data_version -> (version read, read_dashboard_data() output)
+        self.max_versions = max_versions
+
+        self._lock = threading.Lock()
+        self._data = {}     # data_version -> dashboard data
+        self._figures = {}  # (data_version, theme) -> {chart: Figure or None}
+        self._stats = {"hits": 0, "builds": 0, "warm_ups": 0}
+
+    def get(self, data_version, theme="light"):
+        """Returns (dashboard data, figures) of a data version, building them if needed."""
+        theme = theme if theme in THEMES else "light"
+        with self._lock:
+            figures = self._figures.get((data_version, theme))
+            if figures is not None:
+                self._stats["hits"] += 1
+                return self._data[data_version], figures
+
+            data = self._data.get(data_version)
+            if data is None:
+                data_version, data = self.load_data(data_version)
+                figures = self._figures.get((data_version, theme))
+                if figures is not None:
+                    self._stats["hits"] += 1
+                    return self._data[data_version], figures
+            figures = build_dashboard_figures(data, theme)
+
+            self._data[data_version] = data
+            self._figures[(data_version, theme)] = figures
+            self._evict()
+            self._stats["builds"] += 1
+            return data, figures
+
+    def warm(self, data_version, themes=THEMES):
+        """Prebuilds the figures of a data version for every theme."""
+        for theme in themes:
+            self.get(data_version, theme)
+        with self._lock:
+            self._stats["warm_ups"] += 1
+
+    def _evict(self):
+        versions = list(self._data)
+        for version in versions[:-self.max_versions]:
+            del self._data[version]
+            for key in [key for key in self._figures if key[0] == version]:
+                del self._figures[key]
+
+    def stats(self):
+        """Returns a snapshot of the counters and the JSON size of the latest figures (serialized here, not per build)."""
+        with self._lock:
+            stats = dict(self._stats)
+            latest = list(self._figures.values())[-1:]
+        stats["payload_bytes"] = sum(len(fig.to_json()) for figures in latest for fig in figures.values() if fig is not None)
+        return stats
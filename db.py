@@ -0,0 +1,185 @@
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from perf import TracingConnection
+
+# ---------------------------
+# SHARED SQLITE CONNECTION POOL
+# ---------------------------
+# One pool per database file and per process (the app keeps it in
+# st.cache_resource): a set of read-only connections reused by every session
+# plus a single writer connection serialized by a lock. Connections stay open,
+# so their page caches stay warm between reruns. Their statements show up in
+# the active perf trace (see perf.py).
+
+# Applied to every connection
+COMMON_PRAGMAS = {
+    "busy_timeout": 5000,        # ms to wait on a lock before raising "database is locked"
+    "cache_size": -16000,        # page cache of ~16 MB per connection (negative = KiB)
+    "mmap_size": 268435456,      # read the database file through a 256 MB memory map
+    "temp_store": "MEMORY",
+}
+
+# Applied once to the writer connection. WAL lets readers keep reading while a write commits.
+WRITER_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",     # safe with WAL: durable at checkpoints, never corrupted
+}
+
+# Applied to reader connections: they must never write
+READER_PRAGMAS = {
+    "query_only": "ON",
+}
+
+
+def execute_script(conn, script):
+    """
+    Runs a multi-statement SQL script inside the current transaction.
+
+    Unlike conn.executescript(), which commits any pending transaction first,
+    this keeps schema changes and the data they need in one atomic transaction.
+    """
+    statement = ""
+    for line in script.splitlines(keepends=True):
+        statement += line
+        if sqlite3.complete_statement(statement):
+            conn.execute(statement)
+            statement = ""
+    if statement.strip():
+        conn.execute(statement)
+
+
+class ConnectionPool:
+    """Process-wide pool of SQLite connections: up to 'max_readers' readers and one writer."""
+
+    def __init__(self, db_path, max_readers=8, acquire_timeout=30.0):
+        self.db_path = db_path
+        self.max_readers = max_readers
+        self.acquire_timeout = acquire_timeout
+
+        self._idle_readers = queue.LifoQueue()  # LIFO: the most recently used (warmest) connection first
+        self._lock = threading.Lock()
+        self._writer = None
+        self._writer_lock = threading.Lock()
+
+        self._stats = {
+            "readers_created": 0,
+            "readers_in_use": 0,
+            "read_checkouts": 0,
+            "read_waits": 0,
+            "read_wait_seconds": 0.0,
+            "write_checkouts": 0,
+            "write_wait_seconds": 0.0,
+        }
+
+    # --- Connection setup ---
+
+    def _connect(self, pragmas):
+        conn = sqlite3.connect(
+            self.db_path, check_same_thread=False, timeout=COMMON_PRAGMAS["busy_timeout"] / 1000,
+            factory=TracingConnection,  # statements are timed into the active perf trace, if any
+        )
+        conn.row_factory = sqlite3.Row
+        for name, value in {**COMMON_PRAGMAS, **pragmas}.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def _get_writer(self):
+        if self._writer is None:
+            self._writer = self._connect(WRITER_PRAGMAS)
+        return self._writer
+
+    # --- Checkout / return ---
+
+    def acquire(self, write=False):
+        """Borrows a connection. Must be given back with release()."""
+        if write:
+            started = time.perf_counter()
+            if not self._writer_lock.acquire(timeout=self.acquire_timeout):
+                raise sqlite3.OperationalError("Timed out waiting for the database writer connection")
+            try:
+                conn = self._get_writer()
+            except Exception:
+                self._writer_lock.release()
+                raise
+            with self._lock:
+                self._stats["write_checkouts"] += 1
+                self._stats["write_wait_seconds"] += time.perf_counter() - started
+            return conn
+
+        conn = None
+        try:
+            conn = self._idle_readers.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_create = self._stats["readers_created"] < self.max_readers
+                if can_create:
+                    self._stats["readers_created"] += 1
+            if can_create:
+                try:
+                    conn = self._connect(READER_PRAGMAS)
+                except Exception:
+                    with self._lock:
+                        self._stats["readers_created"] -= 1
+                    raise
+            else:
+                # Pool exhausted: wait for another session to give a reader back
+                started = time.perf_counter()
+                try:
+                    conn = self._idle_readers.get(timeout=self.acquire_timeout)
+                except queue.Empty:
+                    raise sqlite3.OperationalError("Timed out waiting for a database reader connection")
+                with self._lock:
+                    self._stats["read_waits"] += 1
+                    self._stats["read_wait_seconds"] += time.perf_counter() - started
+
+        with self._lock:
+            self._stats["read_checkouts"] += 1
+            self._stats["readers_in_use"] += 1
+        return conn
+
+    def release(self, conn):
+        """Gives a borrowed connection back, rolling back anything left uncommitted."""
+        if conn.in_transaction:
+            conn.rollback()
+        if conn is self._writer:
+            self._writer_lock.release()
+            return
+        with self._lock:
+            self._stats["readers_in_use"] -= 1
+        self._idle_readers.put(conn)
+
+    @contextmanager
+    def connection(self, write=False):
+        """Context manager around acquire() / release()."""
+        conn = self.acquire(write=write)
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    # --- Introspection ---
+
+    def stats(self):
+        """Returns a snapshot of the pool counters."""
+        with self._lock:
+            stats = dict(self._stats)
+        stats["readers_idle"] = self._idle_readers.qsize()
+        stats["max_readers"] = self.max_readers
+        stats["writer_busy"] = self._writer_lock.locked()
+        return stats
+
+    def close(self):
+        """Closes the idle readers and the writer connection."""
+        while True:
+            try:
+                self._idle_readers.get_nowait().close()
+            except queue.Empty:
+                break
+        with self._writer_lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
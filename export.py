@@ -0,0 +1,158 @@
+import argparse
+import csv
+import io
+import os
+import tempfile
+import time
+
+from db import ConnectionPool
+from migrations import migrate
+from queries import observations_export_query, products_export_query
+
+# ---------------------------
+# STREAMING CSV / XLSX EXPORT
+# ---------------------------
+# Usage:
+#   python export.py products products.xlsx                 # whole catalog
+#   python export.py products doliprane.csv --search doliprane
+#   python export.py observations history.csv --db path/to.db
+#
+# Also behind the export buttons of the Products and Observations pages. A
+# query result is read from a cursor EXPORT_CHUNK_ROWS rows at a time and written
+# row by row: no DataFrame, memory stays flat whatever the number of rows.
+#   - CSV: UTF-8 with a BOM (opened correctly by Excel), comma separated.
+#   - XLSX: openpyxl write-only workbook; rows go to a temporary sheet file as
+#     they are appended. A sheet holds at most XLSX_MAX_ROWS rows: longer
+#     results continue on the next sheet.
+# On the pages the file is built in a SpooledTemporaryFile (in memory while
+# small, on disk beyond SPOOL_BYTES) only when a button is clicked;
+# st.download_button then serves the finished file as one bytes object.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DB = os.path.join(BASE_DIR, "data", "all_pharma.db")
+
+EXPORT_CHUNK_ROWS = 5000
+XLSX_MAX_ROWS = 1_048_575  # Excel's row limit, minus the header row
+SPOOL_BYTES = 8_000_000
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+
+def iter_rows(conn, sql, params=(), chunk_rows=EXPORT_CHUNK_ROWS):
+    """Returns (column names, iterator over the result rows) reading the cursor 'chunk_rows' rows at a time."""
+    cursor = conn.execute(sql, params)
+    header = [column[0] for column in cursor.description]
+
+    def rows():
+        while True:
+            chunk = cursor.fetchmany(chunk_rows)
+            if not chunk:
+                return
+            yield from chunk
+    return header, rows()
+
+
+def write_csv(header, rows, out):
+    """Writes the rows as CSV into a binary file object. Returns the number of rows written."""
+    text = io.TextIOWrapper(out, encoding="utf-8-sig", newline="")
+    writer = csv.writer(text)
+    writer.writerow(header)
+    count = 0
+    for row in rows:
+        writer.writerow(row)
+        count += 1
+    text.flush()
+    text.detach()  # leave 'out' open for the caller
+    return count
+
+
+def write_xlsx(header, rows, out, sheet_title="Export"):
+    """Writes the rows into a write-only XLSX workbook saved to a binary file object. Returns the number of rows written."""
+    # Imported here: openpyxl is only needed when an XLSX export is requested, not at app startup
+    from openpyxl import Workbook
+    from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+
+    def cell(value):
+        # Control characters are not allowed in XLSX cells
+        return ILLEGAL_CHARACTERS_RE.sub("", value) if isinstance(value, str) else value
+
+    workbook = Workbook(write_only=True)
+    sheet, sheet_rows, count = None, XLSX_MAX_ROWS, 0
+    for row in rows:
+        if sheet_rows == XLSX_MAX_ROWS:
+            title = sheet_title if sheet is None else f"{sheet_title} {len(workbook.worksheets) + 1}"
+            sheet, sheet_rows = workbook.create_sheet(title), 0
+            sheet.append(header)
+        sheet.append([cell(value) for value in row])
+        sheet_rows += 1
+        count += 1
+    if sheet is None:
+        workbook.create_sheet(sheet_title).append(header)
+    workbook.save(out)
+    return count
+
+
+def export_query(conn, sql, params, fmt, out, sheet_title="Export"):
+    """Streams a query result into 'out' as CSV or XLSX. Returns the number of rows written."""
+    header, rows = iter_rows(conn, sql, params)
+    if fmt == "xlsx":
+        return write_xlsx(header, rows, out, sheet_title)
+    return write_csv(header, rows, out)
+
+
+def export_to_file(pool, sql, params, fmt, sheet_title="Export"):
+    """
+    Builds an export on a pooled reader connection. Returns the finished file, rewound.
+
+    Safe to call outside the script thread (st.download_button runs its data
+    callable when the button is clicked): it only uses the pool.
+    """
+    out = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES)
+    with pool.connection() as conn:
+        export_query(conn, sql, params, fmt, out, sheet_title)
+    out.seek(0)
+    return out
+
+
+def export_products(pool, fmt, search=None):
+    """Products matched by a search (the whole catalog without), as a rewound CSV / XLSX file."""
+    sql, params = products_export_query(search)
+    return export_to_file(pool, sql, params, fmt, sheet_title="Products")
+
+
+def export_observations(pool, fmt, **filters):
+    """Observation history matching the history filters, as a rewound CSV / XLSX file."""
+    sql, params = observations_export_query(**filters)
+    return export_to_file(pool, sql, params, fmt, sheet_title="Observations")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export products or observations to CSV or XLSX.")
+    parser.add_argument("what", choices=["products", "observations"])
+    parser.add_argument("path", help="Output file; .xlsx for Excel, CSV otherwise")
+    parser.add_argument("--search", default=None, help="Products: search text, as on the Products page")
+    parser.add_argument("--db", default=DEFAULT_DB, help="SQLite database (default: %(default)s)")
+    args = parser.parse_args()
+
+    fmt = "xlsx" if args.path.lower().endswith(".xlsx") else "csv"
+    if args.what == "products":
+        sql, params = products_export_query(args.search)
+    else:
+        sql, params = observations_export_query()
+
+    started = time.perf_counter()
+    migrate(args.db)  # the search index
+    pool = ConnectionPool(args.db, max_readers=1)
+    try:
+        with pool.connection() as conn, open(args.path, "wb") as out:
+            count = export_query(conn, sql, params, fmt, out, sheet_title=args.what.capitalize())
+    finally:
+        pool.close()
+    print(f"✅ {count} {args.what} exported to {args.path} in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+import argparse
+import math
+import os
+import time
+
+import openpyxl
+
+from db import ConnectionPool
+from migrations import migrate
+from prices import normalize_prices
+
+# ---------------------------
+# STREAMING XLSX IMPORT INTO 'drugs'
+# ---------------------------
+# Usage:
+#   python import_medicaments.py                          # data/medicaments_full.xlsx -> data/all_pharma.db
+#   python import_medicaments.py other.xlsx --db path/to.db --batch-size 2000
+#
+# The workbook is read row by row (openpyxl read-only mode) and written in
+# batches, one transaction per batch, so memory stays bounded by the batch size
+# whatever the number of rows. Rows are upserted on their natural key, the
+# product page URL ('link'), which makes the import safe to re-run.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_XLSX = os.path.join(BASE_DIR, "data", "medicaments_full.xlsx")
+DEFAULT_DB = os.path.join(BASE_DIR, "data", "all_pharma.db")
+
+# Workbook header -> 'drugs' column (headers already named like a 'drugs' column are kept as is)
+COLUMN_MAP = {
+    "nom complet": "name",
+    "nom": "name",
+    "lien": "link",
+    "prix": "price",
+}
+
+# Columns written by the import, besides the normalized price columns
+IMPORT_COLUMNS = ["name", "dosage", "type", "scientific_name", "Code_ATC", "therapeutic_class", "source", "price", "link"]
+
+
+def _clean(value):
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = value.strip()
+        return value or None
+    return value
+
+
+def map_header(header):
+    """Maps workbook headers to 'drugs' columns (None for columns that are not imported)."""
+    mapped = []
+    for cell in header:
+        key = str(cell).strip() if cell is not None else ""
+        col = COLUMN_MAP.get(key.lower())
+        if col is None:
+            col = next((c for c in IMPORT_COLUMNS if c.lower() == key.lower()), None)
+        mapped.append(col)
+    return mapped
+
+
+def split_full_name(full_name):
+    """
+    Splits "NAME (dosage, form)" into (name, dosage, form); (full_name, None, None) if it has no such suffix.
+
+    "ABDIFLY (10mg, comprimé)" -> ("ABDIFLY", "10mg", "comprimé")
+    "ABASAGLAR (100UI/ml (3,64mg/ml), solution injectable)" -> ("ABASAGLAR", "100UI/ml (3,64mg/ml)", "solution injectable")
+    """
+    start, end = full_name.find("("), full_name.rfind(")")
+    if start <= 0 or end != len(full_name) - 1:
+        return full_name, None, None
+    inside = full_name[start + 1:end]
+
+    # First comma outside nested parentheses separates the dosage from the form
+    depth = 0
+    for i, char in enumerate(inside):
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        elif char == "," and depth == 0:
+            name = full_name[:start].strip()
+            return name or full_name, inside[:i].strip() or None, inside[i + 1:].strip() or None
+    return full_name, None, None
+
+
+def parse_row(columns, values):
+    """Builds a 'drugs' record from one workbook row. Returns None when the row has no name or no link."""
+    record = {col: _clean(value) for col, value in zip(columns, values) if col}
+    name = record.get("name")
+    if not name or not record.get("link"):
+        return None
+
+    # Split "NAME (dosage, form)" when dosage / form are not given by their own columns
+    if not record.get("dosage") and not record.get("type"):
+        record["name"], record["dosage"], record["type"] = split_full_name(str(name))
+    return {col: record.get(col) for col in IMPORT_COLUMNS}
+
+
+def iter_batches(xlsx_path, batch_size, counts, sheet=None):
+    """Streams the workbook and yields lists of parsed records; invalid rows are counted as skipped."""
+    workbook = openpyxl.load_workbook(xlsx_path, read_only=True, data_only=True)
+    try:
+        worksheet = workbook[sheet] if sheet else workbook.worksheets[0]
+        rows = worksheet.iter_rows(values_only=True)
+        columns = map_header(next(rows, ()))
+        if "name" not in columns or "link" not in columns:
+            raise ValueError(f"The workbook needs a product name and a link column, found: {columns}")
+
+        batch = []
+        for values in rows:
+            record = parse_row(columns, values)
+            if record is None:
+                counts["skipped"] += 1
+                continue
+            batch.append(record)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    finally:
+        workbook.close()
+
+
+def upsert_batch(conn, batch, counts):
+    """Inserts new products and updates changed ones of a batch in a single transaction."""
+    # Last occurrence wins when the same link appears twice in the batch
+    by_link = {record["link"]: record for record in batch}
+    counts["skipped"] += len(batch) - len(by_link)
+    records = list(by_link.values())
+
+    prices = normalize_prices([record["price"] for record in records])
+    for record, (num, currency, unit) in zip(records, prices.itertuples(index=False)):
+        record["price_numeric"] = None if math.isnan(num) else float(num)
+        record["price_currency"] = currency
+        record["price_unit"] = unit
+
+    links = list(by_link)
+    existing = {}
+    for start in range(0, len(links), 500):
+        chunk = links[start:start + 500]
+        for row in conn.execute(
+            f"SELECT link, {', '.join(IMPORT_COLUMNS)} FROM drugs WHERE link IN ({', '.join('?' for _ in chunk)})",
+            chunk,
+        ):
+            existing[row[0]] = dict(zip(IMPORT_COLUMNS, row[1:]))
+
+    to_insert, to_update = [], []
+    for record in records:
+        current = existing.get(record["link"])
+        if current is None:
+            to_insert.append(record)
+        elif any(current[col] != record[col] for col in IMPORT_COLUMNS):
+            to_update.append(record)
+        else:
+            counts["unchanged"] += 1
+
+    written = IMPORT_COLUMNS + ["price_numeric", "price_currency", "price_unit"]
+    with conn:
+        if to_insert:
+            conn.executemany(
+                f"INSERT INTO drugs ({', '.join(written)}, price_parsed_from) "
+                f"VALUES ({', '.join(':' + col for col in written)}, :price)",
+                to_insert,
+            )
+        if to_update:
+            assignments = ", ".join(f"{col} = :{col}" for col in written if col != "link")
+            conn.executemany(
+                f"UPDATE drugs SET {assignments}, price_parsed_from = :price WHERE link = :link",
+                to_update,
+            )
+    counts["inserted"] += len(to_insert)
+    counts["updated"] += len(to_update)
+
+
+def import_workbook(xlsx_path, db_path, batch_size=1000, sheet=None, progress=None):
+    """Imports a workbook into 'drugs'. Returns the inserted / updated / unchanged / skipped counts."""
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0, "skipped": 0}
+    migrate(db_path)  # 'link' column, normalized price columns, triggers...
+    pool = ConnectionPool(db_path, max_readers=1)
+    try:
+        with pool.connection(write=True) as conn:
+            for batch in iter_batches(xlsx_path, batch_size, counts, sheet=sheet):
+                upsert_batch(conn, batch, counts)
+                if progress:
+                    progress(counts)
+    finally:
+        pool.close()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream an XLSX product list into the 'drugs' table.")
+    parser.add_argument("xlsx", nargs="?", default=DEFAULT_XLSX, help="Workbook to import (default: %(default)s)")
+    parser.add_argument("--db", default=DEFAULT_DB, help="SQLite database (default: %(default)s)")
+    parser.add_argument("--sheet", default=None, help="Worksheet name (default: the first one)")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Rows per transaction (default: %(default)s)")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+
+    def progress(counts):
+        done = counts["inserted"] + counts["updated"] + counts["unchanged"] + counts["skipped"]
+        print(f"\r{done} rows processed...", end="", flush=True)
+
+    counts = import_workbook(args.xlsx, args.db, batch_size=args.batch_size, sheet=args.sheet, progress=progress)
+    print(
+        f"\n✅ Import done in {time.perf_counter() - started:.1f}s: "
+        f"{counts['inserted']} inserted, {counts['updated']} updated, "
+        f"{counts['unchanged']} unchanged, {counts['skipped']} skipped"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+import argparse
+import os
+import time
+
+import pandas as pd
+
+from db import ConnectionPool
+from migrations import migrate
+from queries import INSERT_OBSERVATION, OBSERVATION_TYPES
+
+# ---------------------------
+# BULK OBSERVATION IMPORT (CSV / XLSX)
+# ---------------------------
+# Usage:
+#   python import_observations.py field_reports.xlsx            # -> data/all_pharma.db
+#   python import_observations.py comments.csv --db path/to.db
+#
+# Also used by the Observations page (bulk upload). A file is read whole, then:
+#   1. validated in one vectorized pass: product names are matched against the
+#      catalog (exact, then ignoring case and surrounding spaces), types against
+#      OBSERVATION_TYPES, comments and dates checked; invalid rows are returned
+#      with the reason, never written;
+#   2. written in ONE transaction by a single executemany INSERT (on the page:
+#      one entry of the process-wide write queue, see writer.py). Observations
+#      are append-only: the latest one of each product is read from the
+#      observations index (queries.fetch_latest_observations), 'drugs' is never
+#      updated, so nothing derived from the catalog has to be rebuilt.
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DB = os.path.join(BASE_DIR, "data", "all_pharma.db")
+
+# File header -> observation column (compared lowercased)
+COLUMN_MAP = {
+    "product_name": "product_name",
+    "product": "product_name",
+    "name": "product_name",
+    "produit": "product_name",
+    "nom": "product_name",
+    "type": "type",
+    "comment": "comment",
+    "observation": "comment",
+    "commentaire": "comment",
+    "date": "date",
+}
+
+MAX_COMMENT_LENGTH = 500  # same limit as the single-observation form
+
+
+def read_observation_file(source, filename=None):
+    """Reads a CSV or XLSX file (path or file-like object) into a DataFrame with the observation columns."""
+    filename = filename or getattr(source, "name", None) or str(source)
+    if filename.lower().endswith((".xlsx", ".xlsm")):
+        df = pd.read_excel(source, dtype=str, engine="openpyxl")
+    else:
+        # sep=None: comma or semicolon separated files (spreadsheet exports) are both accepted
+        df = pd.read_csv(source, dtype=str, sep=None, engine="python", encoding="utf-8-sig")
+
+    df = df.rename(columns=lambda header: COLUMN_MAP.get(str(header).strip().lower(), header))
+    if "product_name" not in df.columns or "comment" not in df.columns:
+        raise ValueError(f"The file needs a product name and a comment column, found: {list(df.columns)}")
+    for col in ("type", "date"):
+        if col not in df.columns:
+            df[col] = None
+    return df[["product_name", "type", "comment", "date"]]
+
+
+def validate_observations(df, known_names):
+    """
+    Splits uploaded rows into (valid, rejected) DataFrames.
+
+    'valid' has the observation columns, product names replaced by their catalog
+    spelling and dates as 'YYYY-MM-DD HH:MM:SS' (None: now). 'rejected' keeps
+    the original row, its file line number and the reason.
+    """
+    names = pd.Series(pd.unique(pd.Series(known_names, dtype=object).dropna()), dtype=object)
+    # Case / space-insensitive fallback: first catalog spelling of each normalized name
+    by_key = pd.Series(names.values, index=names.str.strip().str.upper())
+    by_key = by_key[~by_key.index.duplicated()]
+
+    product = df["product_name"].astype(object).where(df["product_name"].notna(), "").astype(str).str.strip()
+    canonical = product.where(product.isin(names), product.str.upper().map(by_key))
+
+    comment = df["comment"].astype(object).where(df["comment"].notna(), "").astype(str).str.strip()
+
+    type_keys = {t.lower(): t for t in OBSERVATION_TYPES}
+    raw_type = df["type"].astype(object).where(df["type"].notna(), "").astype(str).str.strip()
+    obs_type = raw_type.str.lower().map(type_keys).where(raw_type != "", OBSERVATION_TYPES[-1])
+
+    raw_date = df["date"].astype(object).where(df["date"].notna(), "").astype(str).str.strip()
+    given = raw_date.where(raw_date != "")
+    # ISO dates first, then day-first dates as typed in the field reports (dd/mm/yyyy)
+    parsed_date = pd.to_datetime(given, errors="coerce", format="ISO8601")
+    parsed_date = parsed_date.fillna(pd.to_datetime(given, errors="coerce", format="mixed", dayfirst=True))
+    bad_date = (raw_date != "") & parsed_date.isna()
+
+    reason = pd.Series(None, index=df.index, dtype=object)
+    # Later checks first so that the first failing check is the reported one
+    reason = reason.mask(bad_date, "Unreadable date")
+    reason = reason.mask(obs_type.isna(), f"Type must be one of {', '.join(OBSERVATION_TYPES)}")
+    reason = reason.mask(comment.str.len() > MAX_COMMENT_LENGTH, f"Comment longer than {MAX_COMMENT_LENGTH} characters")
+    reason = reason.mask(comment == "", "Empty comment")
+    reason = reason.mask((product != "") & canonical.isna(), "Unknown product")
+    reason = reason.mask(product == "", "Missing product name")
+
+    ok = reason.isna()
+    valid = pd.DataFrame({
+        "product_name": canonical[ok],
+        "type": obs_type[ok],
+        "comment": comment[ok],
+        "date": parsed_date[ok].dt.strftime("%Y-%m-%d %H:%M:%S").astype(object).where(parsed_date[ok].notna(), None),
+    })
+    rejected = df[~ok].assign(line=df.index[~ok] + 2, reason=reason[~ok])  # +2: header line, 1-based
+    return valid, rejected
+
+
+def observation_rows(valid):
+    """Parameter tuples of INSERT_OBSERVATION for validated observations."""
+    return list(valid[["product_name", "type", "comment", "date"]].itertuples(index=False, name=None))
+
+
+def insert_observations(conn, valid):
+    """Writes validated observations in a single transaction. Returns the number of rows inserted."""
+    if valid.empty:
+        return 0
+    rows = observation_rows(valid)
+    with conn:
+        conn.executemany(INSERT_OBSERVATION, rows)
+    return len(rows)
+
+
+def import_observation_file(path, db_path):
+    """Validates and imports a file into 'observations'. Returns (inserted count, rejected DataFrame)."""
+    migrate(db_path)
+    df = read_observation_file(path)
+    pool = ConnectionPool(db_path, max_readers=1)
+    try:
+        with pool.connection(write=True) as conn:
+            known_names = [row[0] for row in conn.execute("SELECT DISTINCT name FROM drugs WHERE name IS NOT NULL")]
+            valid, rejected = validate_observations(df, known_names)
+            inserted = insert_observations(conn, valid)
+    finally:
+        pool.close()
+    return inserted, rejected
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import observations from a CSV or XLSX file.")
+    parser.add_argument("path", help="CSV or XLSX file with product name, type, comment and (optional) date columns")
+    parser.add_argument("--db", default=DEFAULT_DB, help="SQLite database (default: %(default)s)")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    inserted, rejected = import_observation_file(args.path, args.db)
+    print(f"✅ {inserted} observations imported in {time.perf_counter() - started:.1f}s, {len(rejected)} rejected")
+    for row in rejected.itertuples(index=False):
+        print(f"  line {row.line}: {row.reason} ({row.product_name!s})")
+
+
+if __name__ == "__main__":
+    main()
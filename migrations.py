@@ -0,0 +1,162 @@
+import os
+import sqlite3
+import threading
+
+from aggregates import create_aggregates
+from atc import create_atc_index
+from catalog import create_change_log
+from db import COMMON_PRAGMAS, execute_script
+from prices import create_price_columns, normalize_pending_prices
+from queries import (
+    create_product_indexes, create_observation_indexes, create_latest_observation_index, create_observation_product_index,
+)
+from search import create_search_index, create_trigram_index, create_trigram_vocab
+
+# ---------------------------
+# VERSIONED SCHEMA MIGRATIONS
+# ---------------------------
+# Every schema change is a numbered migration, applied in order. The number of
+# the last applied migration is stored in the database itself (PRAGMA
+# user_version), so an up-to-date database costs a single PRAGMA read.
+#
+# Each migration runs in its own transaction together with the user_version
+# bump: it is applied completely or not at all. Migrations must stay idempotent,
+# because databases upgraded by older versions of the app (which created these
+# objects on every rerun) still report user_version 0.
+#
+# Never edit or renumber a released migration: append a new one.
+
+# As first released. "Observations" (filled by the first versions of the app) is
+# no longer read or written, comments live in 'observations': the column is kept
+# only so that the values already stored in it are not lost.
+DRUGS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS "drugs" (
+"scientific_name" TEXT,
+  "Code_ATC" TEXT,
+  "therapeutic_class" TEXT,
+  "description" TEXT,
+  "type" TEXT,
+  "source" TEXT,
+  "name" TEXT,
+  "dosage" TEXT,
+  "price" REAL,
+  "Observations" REAL
+);
+"""
+
+OBSERVATIONS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS observations (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    product_name TEXT NOT NULL,
+    type TEXT,
+    comment TEXT,
+    date TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+IMPORT_SCHEMA = """
+CREATE UNIQUE INDEX IF NOT EXISTS idx_drugs_link ON drugs(link) WHERE link IS NOT NULL;
+"""
+
+
+def _columns(conn, table):
+    return {info[1] for info in conn.execute(f"PRAGMA table_info({table})")}
+
+
+def _add_column(conn, table, column, column_type):
+    if column not in _columns(conn, table):
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}".rstrip())
+
+
+def _base_tables(conn):
+    execute_script(conn, DRUGS_SCHEMA)
+    _add_column(conn, "drugs", "Observations", "TEXT")
+    execute_script(conn, OBSERVATIONS_SCHEMA)
+
+
+def _price_columns(conn):
+    create_price_columns(conn)
+    normalize_pending_prices(conn)
+
+
+def _import_columns(conn):
+    """'link' natural key of the XLSX import (unique when set)."""
+    _add_column(conn, "drugs", "link", "TEXT")
+    execute_script(conn, IMPORT_SCHEMA)
+
+
+# (version, description, function applying it on a connection inside a transaction)
+MIGRATIONS = [
+    (1, "'drugs' and 'observations' tables, 'drugs.Observations' column", _base_tables),
+    (2, "FTS5 product search index", create_search_index),
+    (3, "Products keyset pagination index", create_product_indexes),
+    (4, "Observations history index and row counter", create_observation_indexes),
+    (5, "'drugs' change log", create_change_log),
+    (6, "Normalized price columns", _price_columns),
+    (7, "Dashboard summary tables", create_aggregates),
+    (8, "Import 'link' column", _import_columns),
+    (9, "Latest observation per product index", create_latest_observation_index),
+    (10, "Trigram index for fuzzy name matching", create_trigram_index),
+    (11, "ATC hierarchy index", create_atc_index),
+    (12, "Case-insensitive observations product index", create_observation_product_index),
+    (13, "Trigram index vocabulary for fuzzy name matching", create_trigram_vocab),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+_lock = threading.Lock()
+_migrated = set()  # databases already brought up to date by this process
+
+
+def schema_version(conn):
+    """Number of the last migration applied to the database."""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate_connection(conn):
+    """Applies the pending migrations on an open connection. Returns the list of (version, description) applied."""
+    applied = []
+    if schema_version(conn) >= LATEST_VERSION:
+        return applied
+
+    previous_isolation = conn.isolation_level
+    conn.isolation_level = None  # transactions are opened explicitly below
+    try:
+        for version, description, apply in MIGRATIONS:
+            # IMMEDIATE: take the write lock before re-reading the version, so that
+            # two processes starting together never apply the same migration twice
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if schema_version(conn) >= version:
+                    conn.execute("COMMIT")
+                    continue
+                apply(conn)
+                conn.execute(f"PRAGMA user_version = {int(version)}")
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+            applied.append((version, description))
+    finally:
+        conn.isolation_level = previous_isolation
+    return applied
+
+
+def migrate(db_path):
+    """
+    Brings a database file up to date. Returns the list of (version, description) applied.
+
+    Runs at most once per database and per process: later calls return
+    immediately without opening a connection.
+    """
+    key = os.path.realpath(db_path)
+    with _lock:
+        if key in _migrated:
+            return []
+        conn = sqlite3.connect(db_path, timeout=COMMON_PRAGMAS["busy_timeout"] / 1000)
+        try:
+            applied = migrate_connection(conn)
+        finally:
+            conn.close()
+        _migrated.add(key)
+    return applied
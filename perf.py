@@ -0,0 +1,287 @@
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+# ---------------------------
+# RERUN TIMING SPANS & SQL TRACING
+# ---------------------------
+# A Trace collects what one rerun of one session spent its time on:
+#   - spans: named, nested blocks timed with `with span("name"):`
+#   - queries: every statement run on a pooled connection while the trace is
+#     active (see TracingConnection), with its duration, its row count, the span
+#     it ran in and the number of statements SQLite ran for it. set_trace_callback
+#     reports one call per program step, trigger bodies included, so a count
+#     far above 1 means triggers / FTS maintenance did the work.
+# The active trace lives in a context variable, so concurrent sessions (one
+# script thread each) never mix their spans, even on shared pool connections.
+# Finished traces can be written as JSON lines for offline analysis.
+
+_current_trace = contextvars.ContextVar("perf_trace", default=None)
+
+# Statements kept in a trace: enough for any page, bounded for pathological loops
+MAX_QUERIES = 500
+
+
+class Trace:
+    """Spans and queries of one rerun."""
+
+    def __init__(self, name, trace_sql=True, **meta):
+        self.name = name
+        self.meta = meta
+        self.trace_sql = trace_sql
+        self.started_at = time.time()
+        self._t0 = time.perf_counter()
+        self.duration_ms = None
+        self.spans = []
+        self.queries = []
+        self.dropped_queries = 0
+        self._stack = []
+
+    def _now_ms(self):
+        return (time.perf_counter() - self._t0) * 1000
+
+    @property
+    def finished(self):
+        return self.duration_ms is not None
+
+    @property
+    def current_span(self):
+        return self._stack[-1]["name"] if self._stack else None
+
+    def open_span(self, name, attrs):
+        record = {"name": name, "start_ms": self._now_ms(), "duration_ms": None, "depth": len(self._stack), **attrs}
+        self.spans.append(record)
+        self._stack.append(record)
+        return record
+
+    def close_span(self, record):
+        record["duration_ms"] = self._now_ms() - record["start_ms"]
+        if self._stack and self._stack[-1] is record:
+            self._stack.pop()
+
+    def new_query(self, sql, many=False):
+        if len(self.queries) >= MAX_QUERIES:
+            self.dropped_queries += 1
+            return None
+        query = {
+            "sql": " ".join(sql.split()),
+            "span": self.current_span,
+            "start_ms": self._now_ms(),
+            "duration_ms": 0.0,
+            "rows": 0,
+            "many": many,
+            "statements": 0,
+            "internal": [],
+        }
+        self.queries.append(query)
+        return query
+
+    def finish(self):
+        if self.duration_ms is None:
+            # Spans left open (st.stop() / st.rerun() inside a block) end with the trace
+            while self._stack:
+                self.close_span(self._stack[-1])
+            self.duration_ms = self._now_ms()
+        return self
+
+    def summary(self):
+        """Totals per span name and for SQL, in ms."""
+        sql_ms = sum(q["duration_ms"] for q in self.queries)
+        per_span = {}
+        for record in self.spans:
+            per_span[record["name"]] = per_span.get(record["name"], 0.0) + (record["duration_ms"] or 0.0)
+        return {
+            "duration_ms": round(self.duration_ms or self._now_ms(), 2),
+            "sql_ms": round(sql_ms, 2),
+            "queries": len(self.queries) + self.dropped_queries,
+            "spans": {name: round(ms, 2) for name, ms in per_span.items()},
+        }
+
+    def to_dict(self):
+        def rounded(record):
+            return {k: round(v, 3) if isinstance(v, float) else v for k, v in record.items()}
+        return {
+            "name": self.name,
+            "started_at": self.started_at,
+            **self.meta,
+            **self.summary(),
+            "dropped_queries": self.dropped_queries,
+            "span_list": [rounded(s) for s in self.spans],
+            "query_list": [rounded(q) for q in self.queries],
+        }
+
+
+def start_trace(name, trace_sql=True, **meta):
+    """Starts a trace and makes it the active one of the current thread / context."""
+    trace = Trace(name, trace_sql=trace_sql, **meta)
+    _current_trace.set(trace)
+    return trace
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+def stop_trace(trace=None):
+    """Finishes the trace (the active one by default) and deactivates it."""
+    trace = trace or _current_trace.get()
+    if trace is not None:
+        trace.finish()
+        if _current_trace.get() is trace:
+            _current_trace.set(None)
+    return trace
+
+
+@contextmanager
+def span(name, **attrs):
+    """Times a block in the active trace (no-op without one)."""
+    trace = _current_trace.get()
+    if trace is None or trace.finished:
+        yield None
+        return
+    record = trace.open_span(name, attrs)
+    try:
+        yield record
+    finally:
+        trace.close_span(record)
+
+
+# ---------------------------
+# SQL TRACING (pooled connections)
+# ---------------------------
+
+# Distinct internal statements kept per query (FTS5 shadow tables...)
+MAX_INTERNAL_STATEMENTS = 10
+
+
+def _sql_trace_callback(statement):
+    """set_trace_callback hook: counts the statements SQLite runs for the open query of the active trace."""
+    trace = _current_trace.get()
+    if trace is None or not trace.queries:
+        return
+    query = trace.queries[-1]
+    query["statements"] += 1
+    # Statements run by SQLite itself (not by a cursor) are reported as "-- <sql>"
+    if statement.startswith("-- ") and len(query["internal"]) < MAX_INTERNAL_STATEMENTS:
+        internal = statement[3:]
+        if internal not in query["internal"]:
+            query["internal"].append(internal)
+
+
+class TracingCursor(sqlite3.Cursor):
+    """Cursor timing execute / fetch calls and counting rows into the active trace."""
+
+    _query = None
+
+    def _timed(self, call, *args):
+        started = time.perf_counter()
+        try:
+            return call(*args)
+        finally:
+            if self._query is not None:
+                self._query["duration_ms"] += (time.perf_counter() - started) * 1000
+
+    def execute(self, sql, parameters=()):
+        trace = _current_trace.get()
+        self._query = trace.new_query(sql) if trace is not None else None
+        result = self._timed(super().execute, sql, parameters)
+        if self._query is not None and self.description is None:
+            # INSERT / UPDATE / DELETE: rows written instead of rows fetched
+            self._query["rows"] = max(self.rowcount, 0)
+        return result
+
+    def executemany(self, sql, seq_of_parameters):
+        trace = _current_trace.get()
+        self._query = trace.new_query(sql, many=True) if trace is not None else None
+        result = self._timed(super().executemany, sql, seq_of_parameters)
+        if self._query is not None:
+            self._query["rows"] = max(self.rowcount, 0)
+        return result
+
+    def fetchone(self):
+        row = self._timed(super().fetchone)
+        if row is not None and self._query is not None:
+            self._query["rows"] += 1
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._timed(super().fetchmany, size if size is not None else self.arraysize)
+        if self._query is not None:
+            self._query["rows"] += len(rows)
+        return rows
+
+    def fetchall(self):
+        rows = self._timed(super().fetchall)
+        if self._query is not None:
+            self._query["rows"] += len(rows)
+        return rows
+
+    def __next__(self):
+        row = self._timed(super().__next__)
+        if self._query is not None:
+            self._query["rows"] += 1
+        return row
+
+
+class TracingConnection(sqlite3.Connection):
+    """
+    Connection whose cursors report to the active trace.
+
+    Without an active trace (or one with trace_sql=False) it hands out plain
+    cursors, so untraced reruns pay nothing per row.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.set_trace_callback(_sql_trace_callback)
+
+    def cursor(self, factory=None):
+        if factory is None:
+            trace = _current_trace.get()
+            factory = TracingCursor if trace is not None and trace.trace_sql else sqlite3.Cursor
+        return super().cursor(factory)
+
+    # sqlite3.Connection.execute() does not go through cursor(): route it there
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+
+# ---------------------------
+# STRUCTURED LOG (JSON lines)
+# ---------------------------
+
+_loggers = {}
+_loggers_lock = threading.Lock()
+
+
+def _logger_for(path, max_bytes, backup_count):
+    with _loggers_lock:
+        logger = _loggers.get(path)
+        if logger is None:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            logger = logging.getLogger(f"pharma.perf.{len(_loggers)}")
+            logger.setLevel(logging.INFO)
+            logger.propagate = False
+            handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger.addHandler(handler)
+            _loggers[path] = logger
+        return logger
+
+
+def log_trace(trace, path, max_bytes=10_000_000, backup_count=3):
+    """Appends a finished trace as one JSON line (rotated files). Returns False if the file cannot be written."""
+    try:
+        _logger_for(path, max_bytes, backup_count).info(json.dumps(trace.to_dict(), default=str))
+    except OSError:
+        return False
+    return True
@@ -0,0 +1,126 @@
+import numpy as np
+import pandas as pd
+
+from db import execute_script
+
+# ---------------------------
+# CANONICAL PRICE NORMALIZATION
+# ---------------------------
+# Raw 'drugs.price' values come in many shapes: REAL numbers, "12,5",
+# "Prix (PPA) : \n5252,26 DA", "1 234,56 €/boîte", "N/A", free text...
+# normalize_prices() parses them once, at write / ingest time, into stored columns:
+#   price_numeric      REAL  canonical amount (NULL when no amount can be read)
+#   price_currency     TEXT  ISO code when detected (DZD, EUR, USD, ...)
+#   price_unit         TEXT  unit after "/", "per" or "par" when detected (boîte, tablet, ...)
+#   price_parsed_from        the 'price' value the three columns were computed from
+# A row whose 'price' differs from 'price_parsed_from' (new row, or price changed
+# by any writer) is pending; normalize_pending_prices() finds those rows through
+# a partial index and normalizes them.
+
+PRICE_COLUMNS = {
+    "price_numeric": "REAL",
+    "price_currency": "TEXT",
+    "price_unit": "TEXT",
+    "price_parsed_from": "",  # no type: keeps the exact value (and type) of 'price' for comparison
+}
+
+PRICE_INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_drugs_price_numeric ON drugs(price_numeric);
+CREATE INDEX IF NOT EXISTS idx_drugs_price_pending ON drugs(price) WHERE price IS NOT price_parsed_from;
+"""
+
+# First amount in the text: digits with optional thousands / decimal separators
+_NUMBER_RE = "(\\d[\\d\\s\u00a0\u202f.,']*\\d|\\d)"
+_CURRENCY_RE = r"(?i)(€|\$|£|\bDZD\b|\bDA\b|\bEUR\b|\bUSD\b|\bGBP\b|\bMAD\b|\bTND\b)"
+_UNIT_RE = r"(?i)(?:/|\bper\b|\bpar\b)\s*([^\W\d_]+)"
+
+CURRENCY_CODES = {
+    "€": "EUR", "$": "USD", "£": "GBP",
+    "DA": "DZD", "DZD": "DZD", "EUR": "EUR", "USD": "USD", "GBP": "GBP", "MAD": "MAD", "TND": "TND",
+}
+
+
+def normalize_prices(prices):
+    """
+    Parses raw price values into a DataFrame with 'price_numeric', 'price_currency' and 'price_unit'.
+
+    Fully vectorized (no Python loop per value). The decimal separator is the last
+    '.' or ',' when it appears only once ("1.234,56", "5252,26", "12.5"); any other
+    separator is a thousands separator.
+    """
+    raw = pd.Series(prices, dtype=object).reset_index(drop=True)
+    text = raw.astype("string")
+
+    # Values that are plain numbers (REAL column, "12.5") need no text parsing
+    direct = pd.to_numeric(raw, errors="coerce")
+
+    number = text.str.extract(_NUMBER_RE, expand=False).str.replace("[\\s\u00a0\u202f']", "", regex=True)
+    last_comma = number.str.rfind(",")
+    last_dot = number.str.rfind(".")
+    comma_decimal = (last_comma > last_dot) & (number.str.count(",") == 1)
+    dot_decimal = (last_dot > last_comma) & (number.str.count(r"\.") == 1)
+    canonical = pd.Series(
+        np.select(
+            [comma_decimal.fillna(False).to_numpy(bool), dot_decimal.fillna(False).to_numpy(bool)],
+            [
+                number.str.replace(".", "", regex=False).str.replace(",", ".", regex=False).to_numpy(object),
+                number.str.replace(",", "", regex=False).to_numpy(object),
+            ],
+            default=number.str.replace(r"[.,]", "", regex=True).to_numpy(object),
+        ),
+        dtype=object,
+    )
+    parsed = pd.to_numeric(canonical, errors="coerce")
+
+    amount = direct.fillna(parsed).astype(float)
+
+    # Currency and unit only make sense next to an amount ("N/A" is not a price per "a")
+    currency = text.str.extract(_CURRENCY_RE, expand=False).str.upper().map(CURRENCY_CODES).where(amount.notna())
+    unit = text.str.extract(_UNIT_RE, expand=False).str.lower().where(amount.notna())
+
+    return pd.DataFrame({
+        "price_numeric": amount,
+        "price_currency": currency.astype(object).where(currency.notna(), None),
+        "price_unit": unit.astype(object).where(unit.notna(), None),
+    })
+
+
+def create_price_columns(conn):
+    """Adds the normalized price columns and their indexes to 'drugs' if missing. Returns True if added."""
+    existing = {info[1] for info in conn.execute("PRAGMA table_info(drugs)")}
+    added = False
+    for col, col_type in PRICE_COLUMNS.items():
+        if col not in existing:
+            conn.execute(f"ALTER TABLE drugs ADD COLUMN {col} {col_type}".rstrip())
+            added = True
+    execute_script(conn, PRICE_INDEXES)
+    return added
+
+
+def normalize_pending_prices(conn, batch_size=5000):
+    """Normalizes every row whose 'price' changed since it was last parsed. Returns the number of rows updated."""
+    updated = 0
+    last_rowid = 0
+    while True:
+        rows = conn.execute(
+            "SELECT rowid, price FROM drugs INDEXED BY idx_drugs_price_pending "
+            "WHERE price IS NOT price_parsed_from AND rowid > ? ORDER BY rowid LIMIT ?",
+            (last_rowid, batch_size)
+        ).fetchall()
+        if not rows:
+            break
+        rowids = [row[0] for row in rows]
+        raw = [row[1] for row in rows]
+        normalized = normalize_prices(raw)
+        conn.executemany(
+            "UPDATE drugs SET price_numeric = ?, price_currency = ?, price_unit = ?, price_parsed_from = price WHERE rowid = ?",
+            [
+                (None if pd.isna(num) else float(num), cur, unit, rowid)
+                for num, cur, unit, rowid in zip(
+                    normalized["price_numeric"], normalized["price_currency"], normalized["price_unit"], rowids
+                )
+            ],
+        )
+        updated += len(rows)
+        last_rowid = rowids[-1]
+    return updated
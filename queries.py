@@ -0,0 +1,341 @@
+import json
+import math
+
+import pandas as pd
+
+from db import execute_script
+from search import FTS_TABLE, BM25_WEIGHTS, fts_query
+
+# ---------------------------
+# PRODUCTS: KEYSET (SEEK) PAGINATION
+# ---------------------------
+# Pages are fetched with "WHERE sort_key > last_key_of_previous_page ... LIMIT n"
+# instead of OFFSET, so every page costs one index seek plus page_size rows,
+# whatever the page number or the catalog size.
+#
+# - Browsing sorts by (name, rowid) through idx_drugs_name (NULL names first).
+# - Searching sorts by (bm25 score, rowid) of the FTS5 matches.
+# A page key is the (sort value, rowid) pair of the last row of a page.
+
+PRODUCT_INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_drugs_name ON drugs(name);
+"""
+
+
+def create_product_indexes(conn):
+    """Creates the index backing the Products sort order."""
+    execute_script(conn, PRODUCT_INDEXES)
+
+
+def count_products(conn, search=None):
+    """Counts the products matched by the search text (all products without search)."""
+    if search:
+        query = fts_query(search)
+        if not query:
+            return 0
+        return conn.execute(
+            f"SELECT COUNT(*) FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH ?", (query,)
+        ).fetchone()[0]
+    return conn.execute("SELECT COUNT(*) FROM drugs").fetchone()[0]
+
+
+def fetch_products_page(conn, page_size, after=None, search=None):
+    """
+    Returns (page_df, next_key) for the page following the key 'after'.
+
+    'after' is None for the first page. 'next_key' is None when there is no next page.
+    """
+    if search:
+        df = _search_page(conn, page_size, after, search)
+        key_col = "score"
+    else:
+        df = _browse_page(conn, page_size, after)
+        key_col = "name"
+
+    next_key = None
+    if len(df) == page_size:
+        last = df.iloc[-1]
+        sort_value = last[key_col]
+        next_key = (None if pd.isna(sort_value) else sort_value, int(last["rowid"]))
+    return df, next_key
+
+
+def _browse_page(conn, page_size, after):
+    """One page of 'drugs' ordered by (name, rowid)."""
+    sql = "SELECT rowid, * FROM drugs {where} ORDER BY name, rowid LIMIT ?"
+
+    if after is None:
+        return pd.read_sql_query(sql.format(where=""), conn, params=(page_size,))
+
+    last_name, last_rowid = after
+    if last_name is not None:
+        return pd.read_sql_query(
+            sql.format(where="WHERE (name, rowid) > (?, ?)"), conn,
+            params=(last_name, last_rowid, page_size)
+        )
+
+    # Still inside the leading block of NULL names: finish it, then continue with named rows
+    df = pd.read_sql_query(
+        sql.format(where="WHERE name IS NULL AND rowid > ?"), conn,
+        params=(last_rowid, page_size)
+    )
+    if len(df) < page_size:
+        rest = pd.read_sql_query(
+            sql.format(where="WHERE name IS NOT NULL"), conn,
+            params=(page_size - len(df),)
+        )
+        df = pd.concat([df, rest], ignore_index=True) if not df.empty else rest
+    return df
+
+
+def _search_page(conn, page_size, after, search):
+    """One page of FTS5 matches ordered by (bm25 score, rowid), best match first."""
+    query = fts_query(search)
+    if not query:
+        return pd.DataFrame()
+
+    weights = ", ".join(str(w) for w in BM25_WEIGHTS)
+    where, params = "", [query]
+    if after is not None:
+        where = "WHERE (m.score, m.rid) > (?, ?)"
+        params += list(after)
+    params.append(page_size)
+
+    sql = f"""
+        SELECT d.rowid, d.*, m.score
+        FROM (
+            SELECT rowid AS rid, bm25({FTS_TABLE}, {weights}) AS score
+            FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH ?
+        ) AS m
+        JOIN drugs AS d ON d.rowid = m.rid
+        {where}
+        ORDER BY m.score, m.rid
+        LIMIT ?
+    """
+    return pd.read_sql_query(sql, conn, params=params)
+
+
+# ---------------------------
+# OBSERVATIONS HISTORY: SEEK PAGINATION + MAINTAINED COUNTER
+# ---------------------------
+# History pages are read newest first with "(date, id) < last_key ... LIMIT n"
+# over idx_observations_date. The unfiltered total comes from 'row_counts',
+# a one-row-per-table counter kept current by triggers, instead of COUNT(*).
+
+OBSERVATION_INDEXES = """
+CREATE INDEX IF NOT EXISTS idx_observations_date ON observations(date, id);
+
+CREATE TABLE IF NOT EXISTS row_counts (
+    table_name TEXT PRIMARY KEY,
+    n INTEGER NOT NULL
+);
+
+CREATE TRIGGER IF NOT EXISTS observations_count_ai AFTER INSERT ON observations BEGIN
+    UPDATE row_counts SET n = n + 1 WHERE table_name = 'observations';
+END;
+
+CREATE TRIGGER IF NOT EXISTS observations_count_ad AFTER DELETE ON observations BEGIN
+    UPDATE row_counts SET n = n - 1 WHERE table_name = 'observations';
+END;
+"""
+
+OBSERVATION_TYPES = ["Commercial", "Medical", "Other"]
+
+# Append-only insert of one observation; a None date means "now"
+INSERT_OBSERVATION = (
+    "INSERT INTO observations (product_name, type, comment, date) "
+    "VALUES (?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))"
+)
+
+
+def create_observation_indexes(conn):
+    """Creates the history index and the observations counter (seeded once with COUNT(*))."""
+    execute_script(conn, OBSERVATION_INDEXES)
+    seeded = conn.execute(
+        "SELECT 1 FROM row_counts WHERE table_name = 'observations'"
+    ).fetchone()
+    if not seeded:
+        conn.execute(
+            "INSERT INTO row_counts (table_name, n) SELECT 'observations', COUNT(*) FROM observations"
+        )
+
+
+# ---------------------------
+# LATEST OBSERVATION PER PRODUCT
+# ---------------------------
+# Observations are append-only: the latest one of a product is not copied into
+# 'drugs' on every write, it is read from idx_observations_product_date. For
+# each product name, "ORDER BY date DESC, id DESC LIMIT 1" is a single backward
+# seek in that index (id, the rowid, is its implicit last column), so a whole
+# Products page costs one query and one seek per product. The index also serves
+# the "Product name starts with" filter of the history.
+
+LATEST_OBSERVATION_INDEX = """
+CREATE INDEX IF NOT EXISTS idx_observations_product_date ON observations(product_name, date);
+"""
+
+
+def create_latest_observation_index(conn):
+    """Creates the (product_name, date) index behind fetch_latest_observations()."""
+    execute_script(conn, LATEST_OBSERVATION_INDEX)
+
+
+# The history "Product name starts with" filter ignores case: a NOCASE range over this index
+OBSERVATION_PRODUCT_INDEX = """
+CREATE INDEX IF NOT EXISTS idx_observations_product_nocase ON observations(product_name COLLATE NOCASE);
+"""
+
+
+def create_observation_product_index(conn):
+    """Creates the case-insensitive product_name index behind the history product filter."""
+    execute_script(conn, OBSERVATION_PRODUCT_INDEX)
+
+
+def fetch_latest_observations(conn, names):
+    """Returns the newest observation of each product name given, as a DataFrame indexed by product_name."""
+    names = sorted({name for name in names if isinstance(name, str)})
+    if not names:
+        return pd.DataFrame(columns=["type", "comment", "date"], index=pd.Index([], name="product_name"))
+    # The names travel as one JSON parameter: no limit on the number of products
+    return pd.read_sql_query(
+        """
+        SELECT o.product_name, o.type, o.comment, o.date
+        FROM json_each(?) AS p
+        JOIN observations AS o ON o.id = (
+            SELECT id FROM observations
+            WHERE product_name = p.value
+            ORDER BY date DESC, id DESC LIMIT 1
+        )
+        """,
+        conn,
+        params=(json.dumps(names),),
+        index_col="product_name",
+    )
+
+
+def _observation_filters(product=None, types=None, date_from=None, date_to=None):
+    """Builds the WHERE clauses and parameters shared by the history count and page queries."""
+    clauses, params = [], []
+    if product:
+        # Case-insensitive prefix range ("para" finds "PARACETAMOL"), served by idx_observations_product_nocase
+        clauses.append("product_name >= ? COLLATE NOCASE AND product_name < ? COLLATE NOCASE")
+        params += [product, product + "\U0010ffff"]
+    if types:
+        clauses.append(f"type IN ({', '.join('?' for _ in types)})")
+        params += list(types)
+    if date_from:
+        clauses.append("date >= ?")
+        params.append(date_from.strftime("%Y-%m-%d"))
+    if date_to:
+        # Inclusive end date: everything before the following midnight
+        clauses.append("date < date(?, '+1 day')")
+        params.append(date_to.strftime("%Y-%m-%d"))
+    return clauses, params
+
+
+def count_observations(conn, product=None, types=None, date_from=None, date_to=None):
+    """Counts the observations matching the filters; the unfiltered total is read from 'row_counts'."""
+    clauses, params = _observation_filters(product, types, date_from, date_to)
+    if not clauses:
+        row = conn.execute(
+            "SELECT n FROM row_counts WHERE table_name = 'observations'"
+        ).fetchone()
+        if row is not None:
+            return row[0]
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    return conn.execute(f"SELECT COUNT(*) FROM observations {where}", params).fetchone()[0]
+
+
+def _walk_date_index(conn, page_size, product):
+    """
+    True when a product-filtered page is cheaper read in date order, checking the prefix row by row.
+
+    Through idx_observations_product_nocase a page sorts every match of the
+    prefix; walking idx_observations_date reads about page_size * total /
+    matches rows to fill a page. The matches are counted (index only) up to the
+    break-even point sqrt(page_size * total), so choosing costs no more than the
+    page itself.
+    """
+    total = conn.execute("SELECT n FROM row_counts WHERE table_name = 'observations'").fetchone()
+    if total is None:
+        return False
+    threshold = max(page_size, math.isqrt(page_size * total[0]))
+    clauses, params = _observation_filters(product)
+    matches = conn.execute(
+        f"SELECT COUNT(*) FROM (SELECT 1 FROM observations WHERE {' AND '.join(clauses)} LIMIT ?)",
+        params + [threshold],
+    ).fetchone()[0]
+    return matches >= threshold
+
+
+def fetch_observations_page(conn, page_size, after=None, product=None, types=None, date_from=None, date_to=None):
+    """
+    Returns (page_df, next_key) for the history page following the key 'after', newest first.
+
+    'after' is the (date, id) of the last row of the previous page, None for the first page.
+    With a product filter, a broad prefix is read in date order and a narrow
+    one through idx_observations_product_nocase (see _walk_date_index), so a
+    page never sorts more than about sqrt(page_size * observations) rows.
+    """
+    clauses, params = _observation_filters(product, types, date_from, date_to)
+    if after is not None:
+        clauses.append("(date, id) < (?, ?)")
+        params += list(after)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    indexed = ""
+    if product:
+        walk = _walk_date_index(conn, page_size, product)
+        indexed = f"INDEXED BY {'idx_observations_date' if walk else 'idx_observations_product_nocase'} "
+
+    df = pd.read_sql_query(
+        f"SELECT * FROM observations {indexed}{where} ORDER BY date DESC, id DESC LIMIT ?",
+        conn,
+        params=params + [page_size],
+    )
+
+    next_key = None
+    if len(df) == page_size:
+        last = df.iloc[-1]
+        next_key = (last["date"], int(last["id"]))
+    return df, next_key
+
+
+# ---------------------------
+# EXPORTS
+# ---------------------------
+# Whole result sets of the Products and Observations pages, in the page order,
+# as (sql, params) for export.py, which streams them from a cursor.
+
+PRODUCT_EXPORT_COLUMNS = [
+    "name", "scientific_name", "Code_ATC", "therapeutic_class", "type", "dosage", "source",
+    "price", "price_numeric", "price_currency", "description",
+]
+OBSERVATION_EXPORT_COLUMNS = ["date", "product_name", "type", "comment"]
+
+
+def products_export_query(search=None):
+    """Every product matched by the search (all products without search), ordered like the Products pages."""
+    columns = ", ".join(f"d.{col}" for col in PRODUCT_EXPORT_COLUMNS)
+    if not search:
+        return f"SELECT {columns} FROM drugs AS d ORDER BY d.name, d.rowid", []
+    query = fts_query(search)
+    if not query:
+        return f"SELECT {columns} FROM drugs AS d WHERE 0", []
+    weights = ", ".join(str(w) for w in BM25_WEIGHTS)
+    sql = f"""
+        SELECT {columns}
+        FROM (
+            SELECT rowid AS rid, bm25({FTS_TABLE}, {weights}) AS score
+            FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH ?
+        ) AS m
+        JOIN drugs AS d ON d.rowid = m.rid
+        ORDER BY m.score, m.rid
+    """
+    return sql, [query]
+
+
+def observations_export_query(product=None, types=None, date_from=None, date_to=None):
+    """Every observation matching the history filters, newest first."""
+    clauses, params = _observation_filters(product, types, date_from, date_to)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    return f"SELECT {', '.join(OBSERVATION_EXPORT_COLUMNS)} FROM observations {where} ORDER BY date DESC, id DESC", params
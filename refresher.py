@@ -0,0 +1,145 @@
+import os
+import threading
+import time
+
+from catalog import read_data_version
+from prices import normalize_pending_prices
+
+# ---------------------------
+# BACKGROUND CATALOG REFRESHER
+# ---------------------------
+# One daemon thread per process and database watches the database files and,
+# when 'drugs' changed, rebuilds the in-memory structures derived from it
+# (product name index, Dashboard figures) off the request path. Each structure
+# builds its next state aside and swaps it in at once, so readers keep using the
+# previous complete state until the new one is ready.
+#
+# Watching is cheap: an os.stat() of the database and its WAL file every
+# 'interval' seconds. The data version (catalog.read_data_version) is only read
+# when the files changed, or every 'max_idle' seconds in case a change kept the
+# same modification time and size.
+
+class BackgroundRefresher:
+    """
+    Thread keeping derived structures in step with the database.
+
+    'tasks' is a list of (name, function) called in order with the new data
+    version after every change. A failing task is counted and retried at the
+    next tick; it never stops the thread nor the other tasks.
+    """
+
+    def __init__(self, pool, tasks, interval=2.0, max_idle=30.0, normalize_prices=True):
+        self.pool = pool
+        self.tasks = list(tasks)
+        self.interval = interval
+        self.max_idle = max_idle
+        self.normalize_prices = normalize_prices
+
+        self._stop = threading.Event()
+        self._wake = threading.Event()
+        self._thread = None
+        self._files_signature = None
+        self._version = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+        self.stats = {
+            "checks": 0, "refreshes": 0, "prices_normalized": 0, "errors": 0,
+            "last_refresh_seconds": None, "last_refresh_at": None, "last_error": None, "data_version": None,
+        }
+
+    def add_task(self, name, task):
+        """Adds a task (e.g. a cache created after startup); it first runs at the next change."""
+        self.tasks.append((name, task))
+
+    # --- Thread control ---
+
+    def start(self):
+        """Starts the thread (once). The first refresh runs right away."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="data-refresher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.check()
+            self._wake.wait(self.interval)
+            self._wake.clear()
+
+    # --- Change detection ---
+
+    def _signature(self):
+        """(mtime, size) of the database and WAL files: changes with every committed write."""
+        signature = []
+        for suffix in ("", "-wal"):
+            try:
+                stat = os.stat(self.pool.db_path + suffix)
+                signature.append((stat.st_mtime_ns, stat.st_size))
+            except OSError:
+                signature.append(None)
+        return tuple(signature)
+
+    def check(self):
+        """Refreshes the derived structures if the database changed. Returns True if they were refreshed."""
+        signature = self._signature()
+        now = time.monotonic()
+        if signature == self._files_signature and now - self._last_check < self.max_idle:
+            return False
+        self._files_signature, self._last_check = signature, now
+        with self._lock:
+            self.stats["checks"] += 1
+
+        try:
+            if self.normalize_prices:
+                # Rows written by other tools with a raw price only (partial index: free when none is pending)
+                with self.pool.connection(write=True) as conn:
+                    with conn:
+                        normalized = normalize_pending_prices(conn)
+                if normalized:
+                    with self._lock:
+                        self.stats["prices_normalized"] += normalized
+            with self.pool.connection() as conn:
+                version = read_data_version(conn)
+        except Exception as e:
+            self._record_error("check", e)
+            return False
+        if version == self._version:
+            return False
+        return self.refresh(version)
+
+    def refresh(self, version):
+        """Runs every task for a data version. Returns True when all of them succeeded."""
+        started = time.perf_counter()
+        ok = True
+        for name, task in list(self.tasks):
+            try:
+                task(version)
+            except Exception as e:
+                ok = False
+                self._record_error(name, e)
+        if ok:
+            # A failed task is retried at the next check
+            self._version = version
+        else:
+            self._files_signature = None
+        with self._lock:
+            self.stats["refreshes"] += 1
+            self.stats["last_refresh_seconds"] = round(time.perf_counter() - started, 3)
+            self.stats["last_refresh_at"] = time.strftime("%Y-%m-%d %H:%M:%S")
+            self.stats["data_version"] = version
+        return ok
+
+    def _record_error(self, step, error):
+        with self._lock:
+            self.stats["errors"] += 1
+            self.stats["last_error"] = f"{step}: {error}"
@@ -0,0 +1,330 @@
+import re
+import threading
+from bisect import bisect_left
+
+from catalog import read_data_version
+from db import execute_script
+
+# ---------------------------
+# FULL-TEXT SEARCH INDEX (SQLite FTS5)
+# ---------------------------
+# 'drugs_fts' is an external-content FTS5 table: it stores only the inverted
+# index and reads the column values back from 'drugs' through its rowid.
+# Triggers keep it in sync with every INSERT / UPDATE / DELETE on 'drugs'.
+#
+# Note: 'drugs' has no INTEGER PRIMARY KEY, so a VACUUM may renumber its rowids.
+# Call rebuild_search_index() after a VACUUM to realign the index.
+
+FTS_TABLE = "drugs_fts"
+SEARCH_COLUMNS = ["name", "scientific_name", "Code_ATC", "type"]
+
+# bm25() weights, in SEARCH_COLUMNS order: a hit on the commercial name ranks
+# above a hit on the molecule, the ATC code or the galenic form.
+BM25_WEIGHTS = (10.0, 5.0, 3.0, 1.0)
+
+_COLS = ", ".join(SEARCH_COLUMNS)
+_NEW_COLS = ", ".join(f"new.{c}" for c in SEARCH_COLUMNS)
+_OLD_COLS = ", ".join(f"old.{c}" for c in SEARCH_COLUMNS)
+
+FTS_SCHEMA = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+    {_COLS},
+    content='drugs',
+    content_rowid='rowid',
+    tokenize='unicode61 remove_diacritics 2'
+);
+
+CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON drugs BEGIN
+    INSERT INTO {FTS_TABLE}(rowid, {_COLS}) VALUES (new.rowid, {_NEW_COLS});
+END;
+
+CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON drugs BEGIN
+    INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_COLS}) VALUES ('delete', old.rowid, {_OLD_COLS});
+END;
+
+CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF {_COLS} ON drugs BEGIN
+    INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_COLS}) VALUES ('delete', old.rowid, {_OLD_COLS});
+    INSERT INTO {FTS_TABLE}(rowid, {_COLS}) VALUES (new.rowid, {_NEW_COLS});
+END;
+"""
+
+_PHRASE_RE = re.compile(r'"([^"]*)"|(\S+)')
+
+
+# ---------------------------
+# TRIGRAM INDEX (fuzzy, typo-tolerant matching)
+# ---------------------------
+# 'drugs_trigram' indexes every 3-character sequence of the commercial and
+# molecule names (FTS5 'trigram' tokenizer, case-insensitive), kept in sync by
+# triggers like 'drugs_fts'. A misspelled name still shares most of its
+# trigrams with the right one. fuzzy_matches():
+#   1. reads how many products contain each trigram of the text from the
+#      index vocabulary ('drugs_trigram_vocab', one lookup per trigram);
+#   2. ORs only the rarest trigrams, as long as they hit at most
+#      FUZZY_MAX_POSTINGS rows: common ones ("mg ", "500", " 50") match a
+#      large part of the catalog and say nothing about the name;
+#   3. lets the index rank those candidates (bm25), then re-ranks the best
+#      ones by trigram similarity (Dice coefficient).
+# The rows touched are bounded whatever the catalog size, and no edit distance
+# is ever computed against the whole catalog.
+
+TRIGRAM_TABLE = "drugs_trigram"
+TRIGRAM_VOCAB_TABLE = "drugs_trigram_vocab"
+TRIGRAM_COLUMNS = ["name", "scientific_name"]
+
+_TRI_COLS = ", ".join(TRIGRAM_COLUMNS)
+_TRI_NEW_COLS = ", ".join(f"new.{c}" for c in TRIGRAM_COLUMNS)
+_TRI_OLD_COLS = ", ".join(f"old.{c}" for c in TRIGRAM_COLUMNS)
+
+TRIGRAM_SCHEMA = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS {TRIGRAM_TABLE} USING fts5(
+    {_TRI_COLS},
+    content='drugs',
+    content_rowid='rowid',
+    tokenize='trigram'
+);
+
+CREATE TRIGGER IF NOT EXISTS {TRIGRAM_TABLE}_ai AFTER INSERT ON drugs BEGIN
+    INSERT INTO {TRIGRAM_TABLE}(rowid, {_TRI_COLS}) VALUES (new.rowid, {_TRI_NEW_COLS});
+END;
+
+CREATE TRIGGER IF NOT EXISTS {TRIGRAM_TABLE}_ad AFTER DELETE ON drugs BEGIN
+    INSERT INTO {TRIGRAM_TABLE}({TRIGRAM_TABLE}, rowid, {_TRI_COLS}) VALUES ('delete', old.rowid, {_TRI_OLD_COLS});
+END;
+
+CREATE TRIGGER IF NOT EXISTS {TRIGRAM_TABLE}_au AFTER UPDATE OF {_TRI_COLS} ON drugs BEGIN
+    INSERT INTO {TRIGRAM_TABLE}({TRIGRAM_TABLE}, rowid, {_TRI_COLS}) VALUES ('delete', old.rowid, {_TRI_OLD_COLS});
+    INSERT INTO {TRIGRAM_TABLE}(rowid, {_TRI_COLS}) VALUES (new.rowid, {_TRI_NEW_COLS});
+END;
+"""
+
+TRIGRAM_VOCAB_SCHEMA = f"""
+CREATE VIRTUAL TABLE IF NOT EXISTS {TRIGRAM_VOCAB_TABLE} USING fts5vocab({TRIGRAM_TABLE}, 'row');
+"""
+
+# Candidates re-ranked by similarity per result asked, and the similarity a suggestion needs
+FUZZY_CANDIDATES_PER_RESULT = 20
+FUZZY_MIN_SIMILARITY = 0.3
+# Rows the trigram query may match: the rarest trigrams of the text are ORed up to this many
+FUZZY_MAX_POSTINGS = 2000
+
+
+def create_trigram_index(conn):
+    """Creates the trigram index and its sync triggers; fills it on first creation. Returns True if built."""
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (TRIGRAM_TABLE,)
+    ).fetchone()
+    if exists:
+        return False
+    execute_script(conn, TRIGRAM_SCHEMA)
+    conn.execute(f"INSERT INTO {TRIGRAM_TABLE}({TRIGRAM_TABLE}) VALUES ('rebuild')")
+    return True
+
+
+def create_trigram_vocab(conn):
+    """Creates the vocabulary table of the trigram index (number of products per trigram)."""
+    execute_script(conn, TRIGRAM_VOCAB_SCHEMA)
+
+
+def trigrams(text):
+    """Set of the 3-character sequences of a text, case-insensitive (words separated by one space)."""
+    text = " ".join((text or "").casefold().split())
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def similarity(a, b):
+    """Dice coefficient of the trigram sets of two texts, from 0 (nothing shared) to 1."""
+    ta, tb = trigrams(a), trigrams(b)
+    if not ta or not tb:
+        return 0.0
+    return 2 * len(ta & tb) / (len(ta) + len(tb))
+
+
+def fuzzy_matches(conn, text, limit=5, min_similarity=FUZZY_MIN_SIMILARITY):
+    """
+    Returns up to 'limit' (name, scientific_name, similarity) of the products closest to the text, best first.
+
+    Typos are tolerated: a product is a candidate as soon as it shares one of
+    the rarest trigrams of the text. Products sharing a name are returned once.
+    """
+    grams = trigrams(text)
+    if not grams:
+        return []
+    counts = conn.execute(
+        f"SELECT term, doc FROM {TRIGRAM_VOCAB_TABLE} WHERE term IN ({', '.join('?' for _ in grams)})",
+        sorted(grams),
+    ).fetchall()
+
+    # Rarest trigrams first (a trigram no product contains is not in the vocabulary)
+    chosen, postings = [], 0
+    for gram, docs in sorted(counts, key=lambda item: item[1]):
+        if chosen and postings + docs > FUZZY_MAX_POSTINGS:
+            break
+        chosen.append(gram)
+        postings += docs
+    if not chosen:
+        return []
+
+    query = " OR ".join('"' + gram.replace('"', '""') + '"' for gram in chosen)
+    # Only common trigrams (e.g. "500mg"): no ranking of their whole posting list, the first rows will do
+    order = "ORDER BY t.rank " if postings <= FUZZY_MAX_POSTINGS else ""
+    rows = conn.execute(
+        f"SELECT d.name, d.scientific_name FROM {TRIGRAM_TABLE} AS t JOIN drugs AS d ON d.rowid = t.rowid "
+        f"WHERE {TRIGRAM_TABLE} MATCH ? {order}LIMIT ?",
+        (query, limit * FUZZY_CANDIDATES_PER_RESULT),
+    ).fetchall()
+
+    best = {}
+    for name, scientific_name in rows:
+        if not name:
+            continue
+        score = max(similarity(text, name), similarity(text, scientific_name))
+        if score >= min_similarity and score > best.get(name, (None, -1))[1]:
+            best[name] = (scientific_name, score)
+    ranked = sorted(best.items(), key=lambda item: -item[1][1])[:limit]
+    return [(name, scientific_name, round(score, 3)) for name, (scientific_name, score) in ranked]
+
+
+def create_search_index(conn):
+    """Creates the FTS5 index and its sync triggers; fills it on first creation. Returns True if built."""
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (FTS_TABLE,)
+    ).fetchone()
+    if exists:
+        return False
+    execute_script(conn, FTS_SCHEMA)
+    rebuild_search_index(conn)
+    return True
+
+
+def rebuild_search_index(conn):
+    """Re-reads every row of 'drugs' into the FTS5 index."""
+    conn.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def fts_query(text):
+    """
+    Translates free user input into a safe FTS5 MATCH expression.
+
+    Bare words become prefix queries ('metha' matches 'Methadone'), text in
+    double quotes stays an exact phrase, and all terms must match (implicit AND).
+    Returns an empty string when there is nothing to search for.
+    """
+    terms = []
+    for phrase, word in _PHRASE_RE.findall(text or ""):
+        if phrase.strip():
+            terms.append('"' + phrase.strip() + '"')
+        elif word:
+            word = word.replace('"', "")
+            if word:
+                terms.append('"' + word + '"*')
+    return " ".join(terms)
+
+
+def search_product_ids(conn, text, limit=None):
+    """Returns the rowids of 'drugs' matching the search text, best match first."""
+    query = fts_query(text)
+    if not query:
+        return []
+    sql = (
+        f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH ? "
+        f"ORDER BY bm25({FTS_TABLE}, {', '.join(str(w) for w in BM25_WEIGHTS)})"
+    )
+    params = [query]
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(int(limit))
+    return [row[0] for row in conn.execute(sql, params)]
+
+
+# ---------------------------
+# PRODUCT NAME TYPEAHEAD
+# ---------------------------
+# The product pickers never load the full name list: NameIndex keeps the
+# distinct product names sorted in memory (one copy per process, rebuilt only
+# when the data version of 'drugs' changes) and answers a typed text with at
+# most 'limit' names:
+#   1. names starting with the text: two binary searches in the sorted keys;
+#   2. if that is not enough, names containing a word starting with the text:
+#      an FTS5 prefix query on the 'name' column, best match first.
+# Both are independent of the catalog size, and only 'limit' names reach the page.
+# With refresh_on_read=False the names are only rebuilt by refresh() (called
+# by the background refresher), so a lookup never waits for a rebuild.
+
+def _name_key(name):
+    """Sort / prefix key of a product name: case-insensitive, surrounding spaces ignored."""
+    return (name or "").strip().casefold()
+
+
+class NameIndex:
+    """Sorted distinct product names of the process, for prefix / word typeahead."""
+
+    def __init__(self, pool, refresh_on_read=True):
+        self.pool = pool
+        self.refresh_on_read = refresh_on_read
+        self._lock = threading.Lock()
+        self._entries = ([], [])  # (sorted keys, names in the same order), swapped as a whole
+        self._version = None
+        self.stats = {"refreshes": 0, "lookups": 0, "names": 0}
+
+    def _refresh(self, conn):
+        """Rebuilds the sorted names if 'drugs' changed since the last build."""
+        version = read_data_version(conn)
+        with self._lock:
+            if version == self._version:
+                return self._entries
+            names = [row[0] for row in conn.execute("SELECT DISTINCT name FROM drugs WHERE name IS NOT NULL")]
+            entries = sorted((_name_key(name), name) for name in names)
+            self._entries = ([key for key, _ in entries], [name for _, name in entries])
+            self._version = version
+            self.stats["refreshes"] += 1
+            self.stats["names"] = len(entries)
+            return self._entries
+
+    def refresh(self):
+        """Rebuilds the sorted names now if 'drugs' changed."""
+        with self.pool.connection() as conn:
+            self._refresh(conn)
+
+    def names(self):
+        """All distinct product names, sorted case-insensitively (built on first use, then kept by refresh())."""
+        if self.refresh_on_read or self._version is None:
+            with self.pool.connection() as conn:
+                return self._refresh(conn)[1]
+        return self._entries[1]
+
+    def suggest(self, text, limit=20):
+        """Returns up to 'limit' product names matching the typed text (the first names without text)."""
+        key = _name_key(text)
+        with self.pool.connection() as conn:
+            if self.refresh_on_read or self._version is None:
+                keys, names = self._refresh(conn)
+            else:
+                keys, names = self._entries
+            with self._lock:
+                self.stats["lookups"] += 1
+            if not key:
+                return names[:limit]
+
+            start = bisect_left(keys, key)
+            end = bisect_left(keys, key + "\U0010ffff", lo=start)
+            matches = names[start:min(end, start + limit)]
+            if len(matches) >= limit:
+                return matches
+
+            query = fts_query(text)
+            if not query:
+                return matches
+            seen = set(matches)
+            rows = conn.execute(
+                f"SELECT d.name FROM {FTS_TABLE} AS f JOIN drugs AS d ON d.rowid = f.rowid "
+                f"WHERE {FTS_TABLE} MATCH ? AND d.name IS NOT NULL ORDER BY f.rank LIMIT ?",
+                (f"name : ({query})", limit * 3),
+            )
+            for (name,) in rows:
+                if name not in seen:
+                    seen.add(name)
+                    matches.append(name)
+                    if len(matches) >= limit:
+                        break
+            return matches
@@ -0,0 +1,62 @@
+import pandas as pd
+
+from import_observations import MAX_COMMENT_LENGTH, validate_observations
+from queries import OBSERVATION_TYPES
+
+KNOWN_NAMES = ["DOLIPRANE 1000MG", "Cerezyme", None]
+
+
+def rows(*observations):
+    return pd.DataFrame(observations, columns=["product_name", "type", "comment", "date"])
+
+
+def test_valid_rows_use_the_catalog_spelling_and_defaults():
+    valid, rejected = validate_observations(rows(
+        ["  doliprane 1000mg ", "medical", "Out of stock", "2024-03-05"],
+        ["Cerezyme", None, "Price raised", "05/03/2024 14:30"],
+    ), KNOWN_NAMES)
+
+    assert rejected.empty
+    assert valid["product_name"].tolist() == ["DOLIPRANE 1000MG", "Cerezyme"]
+    assert valid["type"].tolist() == ["Medical", OBSERVATION_TYPES[-1]]
+    assert valid["date"].tolist() == ["2024-03-05 00:00:00", "2024-03-05 14:30:00"]
+
+
+def test_rejection_reasons():
+    valid, rejected = validate_observations(rows(
+        ["", "Commercial", "No product", None],
+        ["Unknown drug", "Commercial", "Not in the catalog", None],
+        ["Cerezyme", "Commercial", "   ", None],
+        ["Cerezyme", "Commercial", "x" * (MAX_COMMENT_LENGTH + 1), None],
+        ["Cerezyme", "Rumour", "Bad type", None],
+        ["Cerezyme", "Commercial", "Bad date", "next tuesday"],
+    ), KNOWN_NAMES)
+
+    assert valid.empty
+    assert rejected["reason"].tolist() == [
+        "Missing product name",
+        "Unknown product",
+        "Empty comment",
+        f"Comment longer than {MAX_COMMENT_LENGTH} characters",
+        f"Type must be one of {', '.join(OBSERVATION_TYPES)}",
+        "Unreadable date",
+    ]
+    # File line numbers: 1-based, after the header line
+    assert rejected["line"].tolist() == [2, 3, 4, 5, 6, 7]
+
+
+def test_first_failing_check_is_reported():
+    _, rejected = validate_observations(rows(
+        ["Unknown drug", "Rumour", "", "next tuesday"],
+    ), KNOWN_NAMES)
+    assert rejected["reason"].tolist() == ["Unknown product"]
+
+
+def test_valid_and_rejected_rows_are_split():
+    valid, rejected = validate_observations(rows(
+        ["Cerezyme", "Other", "Kept", None],
+        ["Cerezyme", "Other", "", None],
+        ["cerezyme", "Other", "Kept too", None],
+    ), KNOWN_NAMES)
+    assert valid["comment"].tolist() == ["Kept", "Kept too"]
+    assert rejected["line"].tolist() == [3]
@@ -0,0 +1,40 @@
+import math
+
+import pytest
+
+from prices import normalize_prices
+
+
+@pytest.mark.parametrize("raw, amount, currency, unit", [
+    (12.5, 12.5, None, None),
+    ("12.5", 12.5, None, None),
+    ("12,5", 12.5, None, None),
+    ("Prix (PPA) : \n5252,26 DA", 5252.26, "DZD", None),
+    ("1 234,56 €/boîte", 1234.56, "EUR", "boîte"),
+    ("1.234,56", 1234.56, None, None),
+    ("1,234.5 MAD", 1234.5, "MAD", None),
+    ("$3.50 per tablet", 3.5, "USD", "tablet"),
+    ("450 DZD par flacon", 450.0, "DZD", "flacon"),
+])
+def test_normalize_prices_parses_amount_currency_and_unit(raw, amount, currency, unit):
+    row = normalize_prices([raw]).iloc[0]
+    assert row["price_numeric"] == pytest.approx(amount)
+    assert row["price_currency"] == currency
+    assert row["price_unit"] == unit
+
+
+@pytest.mark.parametrize("raw", ["N/A", "", None, "sur demande"])
+def test_normalize_prices_without_amount(raw):
+    # No amount: no currency or unit either ("N/A" is not a price per "a")
+    row = normalize_prices([raw]).iloc[0]
+    assert math.isnan(row["price_numeric"])
+    assert row["price_currency"] is None
+    assert row["price_unit"] is None
+
+
+def test_normalize_prices_keeps_the_input_order():
+    result = normalize_prices(["3 €", None, 7.25])
+    assert list(result.columns) == ["price_numeric", "price_currency", "price_unit"]
+    assert result["price_numeric"].tolist()[0] == 3.0
+    assert math.isnan(result["price_numeric"].tolist()[1])
+    assert result["price_numeric"].tolist()[2] == 7.25
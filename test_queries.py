@@ -0,0 +1,55 @@
+import sqlite3
+
+import pytest
+
+from migrations import migrate
+from queries import INSERT_OBSERVATION, _walk_date_index, fetch_observations_page
+
+
+@pytest.fixture
+def conn(tmp_path):
+    db_path = str(tmp_path / "history.db")
+    migrate(db_path)
+    conn = sqlite3.connect(db_path)
+    # 'PARA...' in 90% of the rows (broad prefix), 'Zinc' in a handful (narrow prefix)
+    rows = []
+    for i in range(2000):
+        name = "Zinc 10mg" if i % 200 == 0 else f"PARACETAMOL {i % 7}"
+        rows.append((name, "Other", f"Comment {i}", f"2024-01-{1 + i % 28:02d} {i % 24:02d}:00:00"))
+    conn.executemany(INSERT_OBSERVATION, rows)
+    conn.commit()
+    yield conn
+    conn.close()
+
+
+def all_pages(conn, page_size, **filters):
+    ids, after = [], None
+    while True:
+        page, after = fetch_observations_page(conn, page_size, after=after, **filters)
+        ids += page["id"].tolist()
+        if after is None:
+            return ids
+
+
+def expected_ids(conn, prefix):
+    return [row[0] for row in conn.execute(
+        "SELECT id FROM observations WHERE upper(product_name) LIKE upper(?) || '%' ORDER BY date DESC, id DESC",
+        (prefix,),
+    )]
+
+
+def test_broad_prefix_walks_the_date_index(conn):
+    assert _walk_date_index(conn, 10, "para")
+    assert all_pages(conn, 10, product="para") == expected_ids(conn, "para")
+
+
+def test_narrow_prefix_uses_the_product_index(conn):
+    assert not _walk_date_index(conn, 10, "zinc")
+    assert all_pages(conn, 10, product="zinc") == expected_ids(conn, "zinc")
+
+
+def test_prefix_combines_with_the_other_filters(conn):
+    page, _ = fetch_observations_page(conn, 5, product="PARA", types=["Medical"])
+    assert page.empty
+    page, _ = fetch_observations_page(conn, 5, product="zinc", types=["Other"])
+    assert page["product_name"].tolist() == ["Zinc 10mg"] * 5
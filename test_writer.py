@@ -0,0 +1,55 @@
+import sqlite3
+
+import pytest
+
+from db import ConnectionPool
+from writer import WriteQueue
+
+
+@pytest.fixture
+def pool(tmp_path):
+    db_path = str(tmp_path / "writer.db")
+    conn = sqlite3.connect(db_path)
+    conn.execute("CREATE TABLE notes (id INTEGER PRIMARY KEY, body TEXT NOT NULL)")
+    conn.commit()
+    conn.close()
+    pool = ConnectionPool(db_path, max_readers=1)
+    yield pool
+    pool.close()
+
+
+def bodies(pool):
+    with pool.connection() as conn:
+        return [row[0] for row in conn.execute("SELECT body FROM notes ORDER BY id")]
+
+
+def test_failing_write_is_isolated_in_its_batch(pool):
+    # max_delay: the three writes are submitted well within it, so they share one transaction
+    writes = WriteQueue(pool, max_delay=0.5)
+    try:
+        first = writes.submit("INSERT INTO notes (body) VALUES (?)", ("first",))
+        failing = writes.submit_many("INSERT INTO notes (body) VALUES (?)", [("partial",), (None,)])
+        last = writes.submit("INSERT INTO notes (body) VALUES (?)", ("last",))
+
+        assert first.result(10) == 1
+        with pytest.raises(sqlite3.IntegrityError):
+            failing.result(10)
+        assert last.result(10) == 1
+    finally:
+        writes.stop(10)
+
+    # The failing executemany is rolled back whole ('partial' too), the rest of the batch is committed
+    assert bodies(pool) == ["first", "last"]
+    stats = writes.stats()
+    assert stats["batches"] == 1
+    assert (stats["written"], stats["failed"]) == (2, 1)
+
+
+def test_write_returns_rows_written(pool):
+    writes = WriteQueue(pool)
+    try:
+        writes.write("INSERT INTO notes (body) VALUES (?)", ("one",))
+        assert writes.write("UPDATE notes SET body = upper(body)") == 1
+    finally:
+        writes.stop(10)
+    assert bodies(pool) == ["ONE"]
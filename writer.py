@@ -0,0 +1,196 @@
+import queue
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+# ---------------------------
+# SINGLE-WRITER QUEUE (GROUP COMMIT)
+# ---------------------------
+# Every session submits its writes (observation saves, bulk uploads...) to one
+# queue per process and database; one thread drains it through the pool's
+# writer connection. Writes waiting in the queue when the thread gets to them
+# are committed together: one BEGIN IMMEDIATE / COMMIT (one WAL sync) for the
+# whole batch instead of one per session, so a burst of form submits costs
+# about as much as a single one and never meets a "database is locked".
+#
+# Each write runs in its own SAVEPOINT: a failing write is rolled back and
+# reported to its caller alone, the rest of the batch still commits. submit()
+# returns a concurrent.futures.Future resolved once the write is committed
+# (its result: the number of rows written) or failed (its exception).
+# Readers are never blocked: in WAL mode they keep reading the last commit.
+
+_STOP = object()
+
+
+class WriteQueue:
+    """
+    Process-wide queue serializing writes through one connection.
+
+    'max_batch' bounds the writes of one transaction; 'max_delay' (seconds) is
+    how long the thread waits for more writes after the first one of a batch.
+    The default 0 commits what queued up during the previous commit: batches
+    grow with the load by themselves, and a lone save is not delayed.
+    """
+
+    def __init__(self, pool, max_batch=256, max_delay=0.0, busy_retries=5, latency_window=1000):
+        self.pool = pool
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.busy_retries = busy_retries
+
+        self._queue = queue.Queue()
+        self._thread = None
+        self._start_lock = threading.Lock()
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=latency_window)  # submit -> acknowledgement, ms
+        self._stats = {
+            "submitted": 0, "written": 0, "failed": 0, "batches": 0,
+            "largest_batch": 0, "max_queue_depth": 0, "busy_retries": 0,
+            "last_commit_ms": None, "last_error": None,
+        }
+
+    # --- Submission ---
+
+    def submit(self, sql, params=()):
+        """Queues one statement. Returns a Future of the number of rows it wrote."""
+        return self._put(sql, params, many=False)
+
+    def submit_many(self, sql, rows):
+        """Queues one statement run for every row (executemany), written all or nothing. Returns a Future."""
+        return self._put(sql, list(rows), many=True)
+
+    def write(self, sql, params=(), timeout=30.0):
+        """submit() and wait for the acknowledgement. Raises the write's error."""
+        return self.submit(sql, params).result(timeout)
+
+    def _put(self, sql, params, many):
+        self.start()
+        future = Future()
+        self._queue.put((sql, params, many, future, time.perf_counter()))
+        depth = self._queue.qsize()
+        with self._lock:
+            self._stats["submitted"] += 1
+            self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], depth)
+        return future
+
+    # --- Thread control ---
+
+    def start(self):
+        """Starts the writer thread (once; submit() does it on first use)."""
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="observation-writer", daemon=True)
+                self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        """Writes everything already queued, then stops the thread."""
+        if self._thread is not None:
+            self._queue.put(_STOP)
+            self._thread.join(timeout)
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self):
+        while True:
+            batch, stop = self._next_batch()
+            if batch:
+                self._write_batch(batch)
+            if stop:
+                return
+
+    def _next_batch(self):
+        """Blocks for the first write, then takes what else arrives within 'max_delay'. Returns (batch, stop)."""
+        item = self._queue.get()
+        if item is _STOP:
+            return [], True
+        batch = [item]
+        deadline = time.perf_counter() + self.max_delay
+        while len(batch) < self.max_batch:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.perf_counter()))
+            except queue.Empty:
+                break
+            if item is _STOP:
+                return batch, True
+            batch.append(item)
+        return batch, False
+
+    # --- Group commit ---
+
+    def _begin(self, conn):
+        """BEGIN IMMEDIATE, retried while another process holds the write lock beyond busy_timeout."""
+        for attempt in range(self.busy_retries + 1):
+            try:
+                conn.execute("BEGIN IMMEDIATE")
+                return
+            except sqlite3.OperationalError as e:
+                if "locked" not in str(e) or attempt == self.busy_retries:
+                    raise
+                with self._lock:
+                    self._stats["busy_retries"] += 1
+                time.sleep(0.05 * (attempt + 1))
+
+    def _write_batch(self, batch):
+        results = []  # (future, rows written or exception, submitted at)
+        started = time.perf_counter()
+        try:
+            with self.pool.connection(write=True) as conn:
+                self._begin(conn)
+                try:
+                    for sql, params, many, future, submitted in batch:
+                        conn.execute("SAVEPOINT write_queue")
+                        try:
+                            cursor = conn.executemany(sql, params) if many else conn.execute(sql, params)
+                            results.append((future, max(cursor.rowcount, 0), submitted))
+                            conn.execute("RELEASE write_queue")
+                        except sqlite3.Error as e:
+                            conn.execute("ROLLBACK TO write_queue")
+                            conn.execute("RELEASE write_queue")
+                            results.append((future, e, submitted))
+                    conn.commit()
+                except BaseException:
+                    conn.rollback()
+                    raise
+        except Exception as e:
+            # Nothing of the batch was committed: every write fails with the transaction error
+            results = [(future, e, submitted) for _, _, _, future, submitted in batch]
+            with self._lock:
+                self._stats["last_error"] = str(e)
+
+        done = time.perf_counter()
+        written = failed = 0
+        for future, outcome, submitted in results:
+            if isinstance(outcome, Exception):
+                failed += 1
+                future.set_exception(outcome)
+            else:
+                written += 1
+                future.set_result(outcome)
+            self._latencies.append((done - submitted) * 1000)
+        with self._lock:
+            self._stats["written"] += written
+            self._stats["failed"] += failed
+            self._stats["batches"] += 1
+            self._stats["largest_batch"] = max(self._stats["largest_batch"], len(batch))
+            self._stats["last_commit_ms"] = round((done - started) * 1000, 2)
+
+    # --- Introspection ---
+
+    def stats(self):
+        """Returns a snapshot of the counters, the queue depth and the acknowledgement latency percentiles (ms)."""
+        with self._lock:
+            stats = dict(self._stats)
+            latencies = sorted(self._latencies)
+        stats["queue_depth"] = self._queue.qsize()
+        stats["running"] = self.running
+        stats["average_batch"] = round((stats["written"] + stats["failed"]) / stats["batches"], 2) if stats["batches"] else None
+        if latencies:
+            def percentile(p):
+                return round(latencies[min(len(latencies) - 1, int(p * len(latencies)))], 2)
+            stats.update(latency_p50_ms=percentile(0.5), latency_p95_ms=percentile(0.95), latency_max_ms=round(latencies[-1], 2))
+        return stats